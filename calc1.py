@@ -1,13 +1,8 @@
-import sys
-import datetime
-import pprint
-
-from loguru import logger
-
+import os
+import json
 from collections import defaultdict
-from utils import configure_logging
 
-configure_logging(level="INFO")
+from src import tracing
 
 
 def assign_cluster_ids(subcircuits: list[(str, list)]):
@@ -23,18 +18,16 @@ def assign_cluster_ids(subcircuits: list[(str, list)]):
                     "cluster_names": [subcircuit_name],
                     "cluster_ids": [cluster_id],
                 }
-                logger.debug(
-                    f"Assigning new cluster ID {cluster_id} to transistor {t} in subcircuit {subcircuit_name}"
-                )
             # If the transistor is already in the mapping, update its cluster information
             else:
-                current_data = transistor_to_cluster[t]
-                transistor_to_cluster[t] = {
-                    "cluster_names": current_data["cluster_names"] + [subcircuit_name],
-                    "cluster_ids": current_data["cluster_ids"] + [cluster_id],
-                }
-                logger.debug(
-                    f"Updating transistor {t} with new cluster ID {cluster_id} in subcircuit {subcircuit_name}"
+                transistor_to_cluster[t]["cluster_names"].append(subcircuit_name)
+                transistor_to_cluster[t]["cluster_ids"].append(cluster_id)
+
+            if tracing.enabled:
+                tracing.emit(
+                    "cluster_id",
+                    transistor=t,
+                    cluster=f"{subcircuit_name}-{cluster_id}",
                 )
 
         cluster_id += 1
@@ -56,22 +49,206 @@ def get_cluster_id_transistor_mapping(mapping):
     return cluster_map
 
 
-def compute_cluster_metrics(predicted, ground_truth):
-    """Compute correctness of transistor assignments with subcircuit type consideration."""
+HL1_SUBCIRCUIT_NAMES = ["MosfetDiode", "load_cap", "compensation_cap"]
+
+
+def get_subcircuit_type(name: str) -> str:
+    """Type part of a subcircuit name, i.e. what the pairwise check compares (`CM-4` -> `CM`)."""
+    return name.partition("-")[0]
+
+
+class GroundTruthIndex:
+    """
+    Ground truth of one netlist/level, indexed once for `compute_cluster_metrics`.
+
+    Ground-truth clusters are numbered by position; every transistor (lower-cased) gets
+    the bitset of the clusters containing it and the set of their names, and every
+    subcircuit type the bitset of its clusters. Two transistors share a cluster of type
+    `x` iff `bits[t1] & bits[t2] & type_bits[x] != 0`.
+    """
+
+    def __init__(self, ground_truth: list[(str, list)]):
+        self.is_hierarchical_level1 = ground_truth[0][0] in HL1_SUBCIRCUIT_NAMES
+        self.cluster_names = {}
+        self.bits = {}
+        self.type_bits = defaultdict(int)
+        for cluster_id, (subcircuit_name, components) in enumerate(ground_truth):
+            bit = 1 << cluster_id
+            self.type_bits[get_subcircuit_type(subcircuit_name)] |= bit
+            for transistor in components:
+                t = transistor.lower()
+                if t not in self.bits:
+                    self.bits[t] = 0
+                    self.cluster_names[t] = set()
+                self.bits[t] |= bit
+                self.cluster_names[t].add(subcircuit_name)
+
+    def __len__(self):
+        return len(self.bits)
+
+
+def trace_pairs(cluster: str, members: list[str], masks: list[int]):
+    """Emit the decision of every pair of a predicted cluster (only called when tracing)."""
+    for i in range(len(members)):
+        for j in range(i + 1, len(members)):
+            shared = masks[i] & masks[j]
+            tracing.emit(
+                "pair",
+                cluster=cluster,
+                t1=members[i],
+                t2=members[j],
+                shared_gt_clusters=[
+                    k for k in range(shared.bit_length()) if shared >> k & 1
+                ],
+                ok=bool(shared),
+            )
+
+
+def compute_cluster_counts(
+    predicted, ground_truth, gt_index: GroundTruthIndex = None
+) -> tuple[int, int, int]:
+    """
+    Count correct transistor assignments with subcircuit type consideration.
+
+    A predicted transistor is correct if it exists in the ground truth (HL1), or if its
+    first predicted subcircuit type is one of its ground-truth types and every other
+    member of each predicted cluster shares a ground-truth cluster of the same type
+    with it (HL2/HL3).
+
+    Args:
+        gt_index: prebuilt `GroundTruthIndex` of `ground_truth`, to skip re-indexing it.
+
+    Returns:
+        `(num_correct, num_predicted, num_gt)`: correctly assigned, distinct predicted
+        and distinct ground-truth transistors.
+    """
+    if gt_index is None:
+        gt_index = GroundTruthIndex(ground_truth)
+    gt_bits = gt_index.bits
+
+    # distinct members of every predicted cluster, and the first type of every transistor
+    clusters = []
+    first_cluster_name = {}
+    for subcircuit_name, components in predicted:
+        members = {}
+        for transistor in components:
+            t = transistor.lower()
+            members[t] = None
+            first_cluster_name.setdefault(t, subcircuit_name)
+        clusters.append((subcircuit_name, list(members)))
+
+    if gt_index.is_hierarchical_level1:
+        correct = {t for t in first_cluster_name if t in gt_bits}
+    else:
+        correct = {
+            t
+            for t, name in first_cluster_name.items()
+            if t in gt_bits and name in gt_index.cluster_names[t]
+        }
+
+        if tracing.enabled:
+            tracing.emit("initial_assignments", correct=sorted(correct))
+
+        for cluster_id, (subcircuit_name, members) in enumerate(clusters):
+            if len(members) < 2:
+                continue
+            if any(t not in gt_bits for t in members):
+                # a hallucinated member invalidates every pair of the cluster
+                if tracing.enabled:
+                    tracing.emit(
+                        "cluster",
+                        cluster=f"{subcircuit_name}-{cluster_id}",
+                        members=members,
+                        unknown=[t for t in members if t not in gt_bits],
+                    )
+                correct.difference_update(members)
+                continue
+
+            type_bits = gt_index.type_bits.get(get_subcircuit_type(subcircuit_name), 0)
+            masks = [gt_bits[t] & type_bits for t in members]
+            if tracing.enabled:
+                trace_pairs(f"{subcircuit_name}-{cluster_id}", members, masks)
+            common = type_bits
+            for mask in masks:
+                common &= mask
+            if common:
+                # every pair shares at least one cluster of the right type
+                continue
+            for i, t1 in enumerate(members):
+                if t1 not in correct:
+                    continue
+                for j, mask in enumerate(masks):
+                    if i != j and not masks[i] & mask:
+                        correct.discard(t1)
+                        break
+
+    if tracing.enabled:
+        tracing.emit("assignments", correct=sorted(correct))
+    return len(correct), len(first_cluster_name), len(gt_index)
+
+
+def metrics_from_counts(num_correct_assignments, num_predicted, num_gt) -> dict:
+    """Precision, recall and F1-score from the counts of `compute_cluster_counts`."""
+    # Precision: Fraction of correctly assigned transistors in the predicted set
+    precision = num_correct_assignments / num_predicted if num_predicted else 0
+
+    # Recall: Fraction of correctly assigned transistors in the ground truth set
+    recall = num_correct_assignments / num_gt if num_gt else 0
+
+    # F1-score: Harmonic mean of precision and recall
+    f1_score = (
+        (2 * precision * recall) / (precision + recall)
+        if (precision + recall) > 0
+        else 0
+    )
+
+    return {"Precision": precision, "Recall": recall, "F1-score": f1_score}
+
+
+def compute_cluster_metrics(predicted, ground_truth, gt_index: GroundTruthIndex = None):
+    """
+    Compute correctness of transistor assignments with subcircuit type consideration,
+    see `compute_cluster_counts`. Scores are identical to `compute_cluster_metrics_reference`.
+    """
+    return metrics_from_counts(
+        *compute_cluster_counts(predicted, ground_truth, gt_index)
+    )
+
+
+def compute_cluster_metrics_batch(pairs) -> list[dict]:
+    """
+    Score many `(predicted, ground_truth)` pairs, e.g. every archived LLM output.
+
+    Ground truths are indexed once per distinct object, so scoring several predictions
+    (models, prompts, runs) of the same netlist only pays for the index once.
+    """
+    indexes = {}
+    results = []
+    for predicted, ground_truth in pairs:
+        # keep the ground truth alive next to its index so its id() cannot be reused
+        _, gt_index = indexes.get(id(ground_truth), (None, None))
+        if gt_index is None:
+            gt_index = GroundTruthIndex(ground_truth)
+            indexes[id(ground_truth)] = (ground_truth, gt_index)
+        results.append(compute_cluster_metrics(predicted, ground_truth, gt_index))
+    return results
+
+
+def compute_cluster_metrics_reference(predicted, ground_truth):
+    """Original pairwise implementation of `compute_cluster_metrics`, kept as the reference."""
 
     # assign cluster IDs to transistors in both predicted and ground truth data
     pred_mapping = assign_cluster_ids(predicted)
     gt_mapping = assign_cluster_ids(ground_truth)
 
-    logger.debug(f"pred_mapping :\n\n {pred_mapping}")
-    logger.debug(f"gt_mapping :\n\n {gt_mapping}")
-
     gt_cluster_id_mapping = get_cluster_id_transistor_mapping(gt_mapping)
     pred_cluster_id_mapping = get_cluster_id_transistor_mapping(pred_mapping)
-    logger.debug("gt_cluster_id_mapping:")
-    logger.debug(pprint.pformat(gt_cluster_id_mapping, indent=4))
-    logger.debug("pred_cluster_id_mapping:")
-    logger.debug(pprint.pformat(pred_cluster_id_mapping, indent=4))
+    if tracing.enabled:
+        tracing.emit(
+            "cluster_mappings",
+            gt=dict(gt_cluster_id_mapping),
+            pred=dict(pred_cluster_id_mapping),
+        )
 
     # Example output (for illustration):
     # { 'Inverter-0': ['m3', 'm4', 'm7', 'm5'],
@@ -101,9 +278,8 @@ def compute_cluster_metrics(predicted, ground_truth):
                     correct_assignments[t] = 1
 
     if not is_hierarchical_level1:
-        logger.debug("--------------------")
-        logger.debug(f"**before** pair-wise check: {correct_assignments=}")
-        logger.debug("--------------------")
+        if tracing.enabled:
+            tracing.emit("initial_assignments", correct=dict(correct_assignments))
 
         for cluster_iid, list_transistors in pred_cluster_id_mapping.items():
             for t1 in list_transistors:
@@ -137,9 +313,14 @@ def compute_cluster_metrics(predicted, ground_truth):
                             ]
                         )
                     )
-                    logger.debug(
-                        f"**`{cluster_iid}`, pair-wise check**: {t1=}, {t2=}, {gt_overlap_cluster=}"
-                    )
+                    if tracing.enabled:
+                        tracing.emit(
+                            "pair",
+                            cluster=cluster_iid,
+                            t1=t1,
+                            t2=t2,
+                            shared_gt_clusters=sorted(gt_overlap_cluster),
+                        )
 
                     if len(gt_overlap_cluster) == 0:
                         correct_assignments[t1] = 0
@@ -157,9 +338,8 @@ def compute_cluster_metrics(predicted, ground_truth):
                         correct_assignments[t1] = 0
                         correct_assignments[t2] = 0
 
-        logger.debug("--------------------")
-        logger.debug(f"**after** pair-wise check: {correct_assignments=}")
-        logger.debug("--------------------")
+        if tracing.enabled:
+            tracing.emit("assignments", correct=dict(correct_assignments))
 
     num_correct_assignments = sum([c for _, c in correct_assignments.items()])
 
@@ -241,27 +421,141 @@ def merge_cm_transistor_cluster(ground_truth: list[(str, list)]):
     return new_gt
 
 
+METRIC_KEYS = ("Precision", "Recall", "F1-score")
+
+
+class MetricAccumulator:
+    """
+    Streaming summary of per-netlist metrics that can be merged across shards/processes.
+
+    Keeps the count, sum and sum of squares of every metric (macro mean and variance)
+    and, when the per-netlist counts of `compute_cluster_counts` are given, the pooled
+    numbers of correct/predicted/ground-truth transistors (micro scores).
+
+    Example:
+        accumulator = MetricAccumulator()
+        for predicted, ground_truth in pairs:
+            counts = compute_cluster_counts(predicted, ground_truth)
+            accumulator.update(metrics_from_counts(*counts), counts)
+        accumulator.save("metrics-shard-0.json")
+        ...
+        total = MetricAccumulator.load("metrics-shard-0.json").merge(other_shard)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sums = dict.fromkeys(METRIC_KEYS, 0.0)
+        self.sums_of_squares = dict.fromkeys(METRIC_KEYS, 0.0)
+        # pooled counts, only over the netlists updated with counts
+        self.counted = 0
+        self.num_correct = 0
+        self.num_predicted = 0
+        self.num_gt = 0
+
+    @classmethod
+    def from_metrics(cls, metrics_list) -> "MetricAccumulator":
+        accumulator = cls()
+        for metrics in metrics_list:
+            accumulator.update(metrics)
+        return accumulator
+
+    def update(self, metrics: dict, counts: tuple[int, int, int] = None):
+        """Add one netlist: its metric dict and optionally `(num_correct, num_predicted, num_gt)`."""
+        self.count += 1
+        for key in METRIC_KEYS:
+            self.sums[key] += metrics[key]
+            self.sums_of_squares[key] += metrics[key] ** 2
+        if counts is not None:
+            num_correct, num_predicted, num_gt = counts
+            self.counted += 1
+            self.num_correct += num_correct
+            self.num_predicted += num_predicted
+            self.num_gt += num_gt
+        return self
+
+    def merge(self, other: "MetricAccumulator") -> "MetricAccumulator":
+        """Add another accumulator in place (order of merges does not matter)."""
+        self.count += other.count
+        for key in METRIC_KEYS:
+            self.sums[key] += other.sums[key]
+            self.sums_of_squares[key] += other.sums_of_squares[key]
+        self.counted += other.counted
+        self.num_correct += other.num_correct
+        self.num_predicted += other.num_predicted
+        self.num_gt += other.num_gt
+        return self
+
+    def __add__(self, other: "MetricAccumulator") -> "MetricAccumulator":
+        return MetricAccumulator().merge(self).merge(other)
+
+    def macro(self) -> dict:
+        """Mean over netlists, in the format of `average_metrics`."""
+        if not self.count:
+            return {f"Average {key}": 0 for key in METRIC_KEYS}
+        return {f"Average {key}": self.sums[key] / self.count for key in METRIC_KEYS}
+
+    def std(self) -> dict:
+        """Population standard deviation over netlists."""
+        result = {}
+        for key in METRIC_KEYS:
+            if not self.count:
+                result[f"Std {key}"] = 0
+                continue
+            mean = self.sums[key] / self.count
+            variance = self.sums_of_squares[key] / self.count - mean**2
+            result[f"Std {key}"] = max(variance, 0) ** 0.5
+        return result
+
+    def micro(self) -> dict:
+        """Scores of the pooled transistor counts."""
+        metrics = metrics_from_counts(self.num_correct, self.num_predicted, self.num_gt)
+        return {f"Micro {key}": value for key, value in metrics.items()}
+
+    def summary(self) -> dict:
+        summary = {"Count": self.count, **self.macro(), **self.std()}
+        if self.counted:
+            summary.update(self.micro())
+        return summary
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sums": self.sums,
+            "sums_of_squares": self.sums_of_squares,
+            "counted": self.counted,
+            "num_correct": self.num_correct,
+            "num_predicted": self.num_predicted,
+            "num_gt": self.num_gt,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "MetricAccumulator":
+        accumulator = cls()
+        for key, value in state.items():
+            setattr(accumulator, key, dict(value) if isinstance(value, dict) else value)
+        return accumulator
+
+    def save(self, path: str):
+        """Write the state as JSON (atomically, so concurrent readers never see half a file)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fw:
+            json.dump(self.to_dict(), fw, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MetricAccumulator":
+        with open(path, "r") as fr:
+            return cls.from_dict(json.load(fr))
+
+
 def average_metrics(metrics_list):
     """
     Computes the average of Precision, Recall, and F1-score from a list of metric dictionaries.
 
     :param metrics_list: List of dictionaries containing 'ace', 'precision', and 'f1-score'
-    :return: Dictionary with averaged values
+    :return: Dictionary with averaged values (all zeros for an empty list)
     """
-    if not metrics_list:
-        return {"Average Recall": 0, "Average Precision": 0, "Average F1-score": 0}
-
-    total_recall = sum(m["Recall"] for m in metrics_list)
-    total_precision = sum(m["Precision"] for m in metrics_list)
-    total_f1 = sum(m["F1-score"] for m in metrics_list)
-
-    n = len(metrics_list)
-
-    return {
-        "Average Precision": total_precision / n,
-        "Average Recall": total_recall / n,
-        "Average F1-score": total_f1 / n,
-    }
+    return MetricAccumulator.from_metrics(metrics_list).macro()
 
 
 if __name__ == "__main__":
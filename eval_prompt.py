@@ -1,16 +1,30 @@
 import os
+import re
 import json
+import asyncio
+import hashlib
 import datetime
 import hydra
 from omegaconf import DictConfig, OmegaConf
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from loguru import logger
 
 from langchain_core.prompts import ChatPromptTemplate
-from calc1 import compute_cluster_metrics, average_metrics
+from calc1 import (
+    compute_cluster_counts,
+    metrics_from_counts,
+    average_metrics,
+    MetricAccumulator,
+    GroundTruthIndex,
+)
+from src.bootstrap import confidence_intervals, paired_comparisons
+from src.llm_cache import open_llm_cache, get_generation_params
+from src.rate_limit import get_scheduler
 from src.netlist import SPICENetlist
+from src.dataset import BenchmarkDataset, parse_shard
 from utils import ppformat, configure_logging
-from models import load_llms
+from models import load_llms, get_provider
 from prompt_collections.hl1 import (
     prompt_hl1_direct_prompting,
     prompt_hl1_direct_prompting_with_instrucion,
@@ -25,26 +39,26 @@ from prompt_collections.hl3 import (
 )
 
 
+def parse_llm_output(content: str) -> list:
+    """Clusters of the JSON list between `<json>` tags as `(sub_circuit_name, components)`."""
+    parsed_data = json.loads(
+        content[content.find("<json>") + len("<json>") : content.find("</json>")]
+    )
+    assert isinstance(
+        parsed_data, list
+    ), f"parsed_data invalid type: {type(parsed_data)}"
+    return [
+        (cluster["sub_circuit_name"], cluster["components"]) for cluster in parsed_data
+    ]
+
+
 def llm_invoke(model, prompt, data: SPICENetlist) -> list[str, str]:
     try:
         logger.info(prompt.invoke(data.netlist).to_string())
         chain = prompt | model  # | parser
         output = chain.invoke({"netlist": data.netlist})
         logger.info("output before parsing: " + str(output))
-        parsed_data = json.loads(
-            output.content[
-                output.content.find("<json>")
-                + len("<json>") : output.content.find("</json>")
-            ]
-        )
-        assert isinstance(
-            parsed_data, list
-        ), f"parsed_data invalid type: {type(parsed_data)}"
-        parsed_data = [
-            (cluster["sub_circuit_name"], cluster["components"])
-            for cluster in parsed_data
-        ]
-        return output.content, parsed_data
+        return output.content, parse_llm_output(output.content)
 
     except json.decoder.JSONDecodeError as e:
         logger.error(f"parsing LLM output failed: " + output.content)
@@ -54,116 +68,389 @@ def llm_invoke(model, prompt, data: SPICENetlist) -> list[str, str]:
         return output, None
 
 
+async def llm_ainvoke(model, prompt, data: SPICENetlist) -> list[str, str]:
+    """`llm_invoke` with `ainvoke`, so many netlists can wait on the API at once."""
+    if not hasattr(model, "ainvoke"):
+        # e.g. `google_genai_model`: run the blocking call in a worker thread
+        return await asyncio.to_thread(llm_invoke, model, prompt, data)
+    try:
+        logger.info(prompt.invoke(data.netlist).to_string())
+        chain = prompt | model  # | parser
+        output = await chain.ainvoke({"netlist": data.netlist})
+        logger.info("output before parsing: " + str(output))
+        return output.content, parse_llm_output(output.content)
+
+    except json.decoder.JSONDecodeError as e:
+        logger.error(f"parsing LLM output failed: " + output.content)
+        return output.content, None
+    except Exception as e:
+        logger.error(f"exception: {e}")
+        return output, None
+
+
+def get_ground_truth(data: SPICENetlist, category: str):
+    """Ground truth of the level a category evaluates ("HL1", "HL2-CM", ...), None if unknown."""
+    return {"HL1": data.hl1_gt, "HL2": data.hl2_gt, "HL3": data.hl3_gt}.get(
+        category[:3]
+    )
+
+
+def get_metrics_path(llm_output_dir: str, shard=None) -> str:
+    """Accumulated metrics of a run (one file per shard, see `merge_metrics`)."""
+    shard = parse_shard(shard)
+    if shard is None:
+        return os.path.join(llm_output_dir, "metrics.json")
+    shard_id, num_shards = shard
+    return os.path.join(
+        llm_output_dir, f"metrics-shard-{shard_id}-of-{num_shards}.json"
+    )
+
+
+def merge_metrics(llm_output_dir: str) -> MetricAccumulator:
+    """
+    Combine the metrics of the shards written to `llm_output_dir`.
+
+    Only one family of files is merged: the `metrics-shard-<i>-of-<n>.json` files when
+    there are any (all with the same `n`), otherwise `metrics.json`. An unsharded
+    rerun next to the shards would otherwise count every netlist twice.
+    """
+    shards = {}
+    for name in os.listdir(llm_output_dir):
+        match = re.fullmatch(r"metrics-shard-(\d+)-of-(\d+)\.json", name)
+        if match:
+            shards[int(match[1]), int(match[2])] = name
+    accumulator = MetricAccumulator()
+    if not shards:
+        metrics_path = get_metrics_path(llm_output_dir)
+        if os.path.exists(metrics_path):
+            accumulator.merge(MetricAccumulator.load(metrics_path))
+        return accumulator
+
+    num_shards = {n for _, n in shards}
+    if len(num_shards) > 1:
+        raise ValueError(
+            f"{llm_output_dir} mixes shards of {sorted(num_shards)} shard runs"
+        )
+    (n,) = num_shards
+    missing = sorted(set(range(n)) - {i for i, _ in shards})
+    if missing:
+        logger.warning(f"{llm_output_dir}: shards {missing} of {n} are missing")
+    if os.path.exists(get_metrics_path(llm_output_dir)):
+        logger.warning(f"{llm_output_dir}: ignoring metrics.json next to the shards")
+    for key in sorted(shards):
+        accumulator.merge(
+            MetricAccumulator.load(os.path.join(llm_output_dir, shards[key]))
+        )
+    return accumulator
+
+
+def invoke_prompt(model, prompt, data: SPICENetlist, max_attempts: int = 2):
+    """`llm_invoke` retried up to `max_attempts` times; returns the last `(output, parsed_data)`."""
+    for _ in range(max_attempts):
+        try:
+            output, parsed_data = llm_invoke(model, prompt, data)
+        except Exception as e:
+            logger.error(f"exception: {e}")
+            output, parsed_data = None, None
+        if output is not None and parsed_data is not None:
+            break
+        logger.error("LLM output is None")
+    return output, parsed_data
+
+
+async def ainvoke_prompt(model, prompt, data: SPICENetlist, max_attempts: int = 2):
+    """`invoke_prompt` with `llm_ainvoke`."""
+    for _ in range(max_attempts):
+        try:
+            output, parsed_data = await llm_ainvoke(model, prompt, data)
+        except Exception as e:
+            logger.error(f"exception: {e}")
+            output, parsed_data = None, None
+        if output is not None and parsed_data is not None:
+            break
+        logger.error("LLM output is None")
+    return output, parsed_data
+
+
+def merge_partial_results(answers):
+    """
+    Combine the `(output, parsed_data)` answers of the prompts of one netlist (e.g. the
+    DiffPair/CM/Inverter prompts of a split HL2 prompt), in prompt order.
+
+    Returns:
+        `(outputs, parsed_data)`: the raw text answers, and the concatenated clusters or
+        None if any prompt failed every attempt.
+    """
+    outputs = [output for output, _ in answers if isinstance(output, str)]
+    if any(parsed_data is None for _, parsed_data in answers):
+        return outputs, None
+    return outputs, [cluster for _, parsed_data in answers for cluster in parsed_data]
+
+
+def invoke_prompts(model, prompts, data: SPICENetlist, max_attempts: int = 2):
+    """
+    Query `model` with every prompt of a netlist, concurrently when the prompt is split.
+    Each prompt is retried on its own, so successful partial answers are kept.
+
+    Returns:
+        `(outputs, parsed_data)`, see `merge_partial_results`.
+    """
+    if len(prompts) == 1:
+        answers = [invoke_prompt(model, prompts[0], data, max_attempts)]
+    else:
+        with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+            answers = list(
+                executor.map(
+                    lambda p: invoke_prompt(model, p, data, max_attempts), prompts
+                )
+            )
+    return merge_partial_results(answers)
+
+
+async def ainvoke_prompts(model, prompts, data: SPICENetlist, max_attempts: int = 2):
+    """`invoke_prompts` with `ainvoke_prompt`."""
+    answers = await asyncio.gather(
+        *(ainvoke_prompt(model, p, data, max_attempts) for p in prompts)
+    )
+    return merge_partial_results(answers)
+
+
+def get_unit_hash(prompts, data: SPICENetlist, metadata: dict) -> str:
+    """
+    Fingerprint of a work unit: model, its generation parameters, category and the
+    rendered prompts sent for it.
+    """
+    content = json.dumps(
+        [
+            metadata.get("model_name"),
+            metadata.get("generation_params"),
+            metadata.get("category"),
+            [prompt.invoke(data.netlist).to_string() for prompt in prompts],
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def write_json_atomic(path: str, content):
+    """Write JSON so that a killed job leaves either the old or the new file behind."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fw:
+        fw.write(json.dumps(content, indent=2))
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(result_dir: str, unit_hash: str):
+    """
+    `(eval_results, counts)` of a unit completed by an earlier run with the same prompts
+    and config (`checkpoint.json` is written last, after `eval_results.json`), else None.
+    """
+    try:
+        with open(os.path.join(result_dir, "checkpoint.json"), "r") as fr:
+            checkpoint = json.load(fr)
+        if checkpoint.get("hash") != unit_hash:
+            return None
+        with open(os.path.join(result_dir, "eval_results.json"), "r") as fr:
+            return json.load(fr), tuple(checkpoint["counts"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def resume_netlist(i: int, data: SPICENetlist, prompts, metadata: dict):
+    """Stored result of netlist `i` when resuming (`metadata["resume"]`), None otherwise."""
+    if not metadata.get("resume"):
+        return None
+    evaluation = load_checkpoint(
+        f"{metadata['llm_output_dir']}/netlist_{i}",
+        get_unit_hash(prompts, data, metadata),
+    )
+    if evaluation is not None:
+        logger.info(f"netlist #{i}: resumed from checkpoint")
+    return evaluation
+
+
+def save_ground_truth(result_dir: str, data: SPICENetlist):
+    with open(f"{result_dir}/gt.json", "w") as fw:
+        content = {
+            "hl1_gt": data.hl1_gt,
+            "hl2_gt": data.hl2_gt,
+            "hl3_gt": data.hl3_gt,
+        }
+        fw.write(json.dumps(content, indent=2))
+
+
+def save_netlist_result(
+    i: int,
+    data: SPICENetlist,
+    dataset: BenchmarkDataset,
+    prompts,
+    category: str,
+    metadata: dict,
+    outputs: list[str],
+    parsed_data,
+):
+    """
+    Score the parsed LLM answer of netlist `i` and write its `netlist_<i>/` files.
+
+    Returns:
+        `(eval_results, counts)` as given to `MetricAccumulator.update` (zeros if the
+        LLM calls failed), or None for an unknown category.
+    """
+    result_dir = f"{metadata['llm_output_dir']}/netlist_{i}"
+    if parsed_data is None:
+        logger.info(
+            f"can not identify subcircuit in the netlist: {dataset.netlist_path(i)}"
+        )
+        ground_truth = get_ground_truth(data, category)
+        Path(result_dir).mkdir(parents=True, exist_ok=True)
+        # lets `src.rescore` count the failure like this function does
+        save_ground_truth(result_dir, data)
+        # results of an earlier successful run must not be resumed or re-scored in
+        # place of this failure
+        for name in ("checkpoint.json", "eval_results.json", "parsed_data.json"):
+            if os.path.exists(f"{result_dir}/{name}"):
+                os.remove(f"{result_dir}/{name}")
+        for output_index, output_data in enumerate(outputs):
+            with open(f"{result_dir}/output_{output_index}.txt", "w") as fw:
+                fw.write(output_data)
+                fw.write("\n------------------------\n")
+        return (
+            {"Precision": 0, "Recall": 0, "F1-score": 0},
+            (0, 0, len(GroundTruthIndex(ground_truth)) if ground_truth else 0),
+        )
+
+    output = "\n".join(outputs)
+    logger.info(f"# output={output}")
+
+    logger.info("------------------------------------")
+    logger.info(f"predicted_output: {ppformat(parsed_data)}")
+
+    ground_truth = get_ground_truth(data, category)
+    if ground_truth is None:
+        logger.error(f"unknown category: {category}")
+        return None
+    logger.info(f"ground truth: {ppformat(ground_truth)}")
+    counts = compute_cluster_counts(parsed_data, ground_truth)
+    eval_results = metrics_from_counts(*counts)
+
+    logger.info(f"{eval_results=}")
+    logger.info("------------------------------------")
+
+    # Save prompt and netlist data
+
+    Path(result_dir).mkdir(parents=True, exist_ok=True)
+    with open(f"{result_dir}/data.txt", "w") as fw:
+        fw.write(data.netlist)
+        fw.write("\n------------------------\n")
+        fw.write("hl1_gt: \n" + ppformat(data.hl1_gt))
+        fw.write("\n\n")
+        fw.write("hl2_gt: \n" + ppformat(data.hl2_gt))
+
+    save_ground_truth(result_dir, data)
+
+    for prompt_index, prompt in enumerate(prompts):
+        with open(f"{result_dir}/prompt_{prompt_index}.txt", "w") as fw:
+            fw.write(prompt.invoke(data.netlist).to_string())
+
+    # Save the output to a file
+    for output_index, output_data in enumerate(outputs):
+        with open(f"{result_dir}/output_{output_index}.txt", "w") as fw:
+            fw.write(output_data)
+            fw.write("\n------------------------\n")
+
+    with open(f"{result_dir}/parsed_data.json", "w") as fw:
+        fw.write(json.dumps(parsed_data, indent=2))
+
+    write_json_atomic(f"{result_dir}/eval_results.json", eval_results)
+    # marks the unit as complete for `resume`, so it is written last
+    write_json_atomic(
+        f"{result_dir}/checkpoint.json",
+        {"hash": get_unit_hash(prompts, data, metadata), "counts": list(counts)},
+    )
+
+    return eval_results, counts
+
+
+async def aevaluate_netlists(
+    model, prompts, category: str, metadata: dict, dataset: BenchmarkDataset
+) -> list:
+    """
+    `save_netlist_result` of every netlist, keeping up to `metadata["concurrency"]`
+    netlists waiting on the LLM at once. Files are written as soon as a netlist is
+    answered; the returned list is in netlist order.
+    """
+    semaphore = asyncio.Semaphore(metadata["concurrency"])
+
+    async def evaluate(i, data):
+        evaluation = resume_netlist(i, data, prompts, metadata)
+        if evaluation is not None:
+            return evaluation
+        async with semaphore:
+            logger.info("netlist #" + str(i))
+            outputs, parsed_data = await ainvoke_prompts(model, prompts, data)
+        return save_netlist_result(
+            i, data, dataset, prompts, category, metadata, outputs, parsed_data
+        )
+
+    return await asyncio.gather(*(evaluate(i, data) for i, data in dataset))
+
+
 def find_subcircuits(
     subset: str = "medium",
     model: str = None,
     prompts: str = None,
     category: str = "single",
     metadata: str = None,
+    dataset: BenchmarkDataset = None,
 ):
-    results = []
-    max_attempts = 2
-
-    for i in range(1, 101):
-        data = SPICENetlist(f"data/asi-fuboco-test/{subset}/{i}/")
-        logger.info("netlist #" + str(i))
-
-        num_attempts = 0
-        result_dir = f"{metadata['llm_output_dir']}/netlist_{i}"
-        while num_attempts < max_attempts:
-            try:
-                if len(prompts) == 1:
-                    outputs = []
-                    output, parsed_data = llm_invoke(model, prompts[0], data)
-                    parsed_data = parsed_data
-                    if output is None or parsed_data is None:
-                        raise Exception("LLM output is None")
-                    outputs.append(output)
-                else:
-                    parsed_data = []
-                    outputs = []
-                    for p in prompts:
-                        partial_output, partial_parsed_data = llm_invoke(model, p, data)
-                        if partial_output is None or partial_parsed_data is None:
-                            raise Exception("LLM (partial) output is None")
-                        parsed_data += partial_parsed_data
-                        outputs.append(partial_output)
-                break
-            except Exception as e:
-                logger.error(f"exception: {e}")
-                num_attempts += 1
-                continue
+    if dataset is None:
+        dataset = BenchmarkDataset(subset)
 
-        if num_attempts >= max_attempts:
-            logger.info(
-                f"can not identify subcircuit in the netlist: data/asi-fuboco-test/{subset}/{i}/"
+    if metadata.get("concurrency"):
+        evaluated = asyncio.run(
+            aevaluate_netlists(model, prompts, category, metadata, dataset)
+        )
+    else:
+        evaluated = []
+        for i, data in dataset:
+            logger.info("netlist #" + str(i))
+            evaluation = resume_netlist(i, data, prompts, metadata)
+            if evaluation is not None:
+                evaluated.append(evaluation)
+                continue
+            outputs, parsed_data = invoke_prompts(model, prompts, data)
+            evaluated.append(
+                save_netlist_result(
+                    i, data, dataset, prompts, category, metadata, outputs, parsed_data
+                )
             )
-            results.append({"Precision": 0, "Recall": 0, "F1-score": 0})
-            for output_index, output_data in enumerate(outputs):
-                with open(f"{result_dir}/output_{output_index}.txt", "w") as fw:
-                    fw.write(output_data)
-                    fw.write("\n------------------------\n")
-
-            continue
-
-        output = "\n".join(outputs)
-        logger.info(f"# output={output}")
-
-        logger.info("------------------------------------")
-        logger.info(f"predicted_output: {ppformat(parsed_data)}")
-
-        if category.startswith("HL1"):
-            logger.info(f"ground truth: {ppformat(data.hl1_gt)}")
-            eval_results = compute_cluster_metrics(parsed_data, data.hl1_gt)
-        elif category.startswith("HL2"):
-            logger.info(f"ground truth: {ppformat(data.hl2_gt)}")
-            eval_results = compute_cluster_metrics(parsed_data, data.hl2_gt)
-        elif category.startswith("HL3"):
-            logger.info(f"ground truth: {ppformat(data.hl3_gt)}")
-            eval_results = compute_cluster_metrics(parsed_data, data.hl3_gt)
-        else:
-            logger.error(f"unknown category: {category}")
-            return
+            if evaluated[-1] is None:
+                break
 
-        logger.info(f"{eval_results=}")
-        logger.info("------------------------------------")
+    # aggregate in netlist order, whatever order the answers arrived in
+    results = []
+    accumulator = MetricAccumulator()
+    for evaluation in evaluated:
+        if evaluation is None:
+            return
+        eval_results, counts = evaluation
         results.append(eval_results)
+        accumulator.update(eval_results, counts)
 
-        # Save prompt and netlist data
-
-        Path(result_dir).mkdir(parents=True, exist_ok=True)
-        with open(f"{result_dir}/data.txt", "w") as fw:
-            fw.write(data.netlist)
-            fw.write("\n------------------------\n")
-            fw.write("hl1_gt: \n" + ppformat(data.hl1_gt))
-            fw.write("\n\n")
-            fw.write("hl2_gt: \n" + ppformat(data.hl2_gt))
-
-        with open(f"{result_dir}/gt.json", "w") as fw:
-            content = {
-                "hl1_gt": data.hl1_gt,
-                "hl2_gt": data.hl2_gt,
-                "hl3_gt": data.hl3_gt,
-            }
-            fw.write(json.dumps(content, indent=2))
-
-        for prompt_index, prompt in enumerate(prompts):
-            with open(f"{result_dir}/prompt_{prompt_index}.txt", "w") as fw:
-                fw.write(prompt.invoke(data.netlist).to_string())
-
-        # Save the output to a file
-        for output_index, output_data in enumerate(outputs):
-            with open(f"{result_dir}/output_{output_index}.txt", "w") as fw:
-                fw.write(output_data)
-                fw.write("\n------------------------\n")
-
-        with open(f"{result_dir}/parsed_data.json", "w") as fw:
-            fw.write(json.dumps(parsed_data, indent=2))
+    # mergeable summary, so sharded or resumed runs do not need every eval_results.json
+    accumulator.save(
+        get_metrics_path(metadata["llm_output_dir"], metadata.get("shard"))
+    )
+    return results
 
-        with open(f"{result_dir}/eval_results.json", "w") as fw:
-            fw.write(json.dumps(eval_results, indent=2))
 
-    return results
+def get_concurrency(config: DictConfig, model_name: str):
+    """Netlists in flight for a model (`provider_concurrency`), None to evaluate them one by one."""
+    provider_concurrency = config.get("provider_concurrency")
+    if not provider_concurrency:
+        return None
+    return provider_concurrency.get(get_provider(model_name), 1)
 
 
 @hydra.main(version_base=None, config_path="conf", config_name="config")
@@ -186,9 +473,22 @@ def main(config: DictConfig) -> None:
         "Inverter": "HL2-Inverter",
     }
 
+    llm_cache = open_llm_cache(config.get("llm_cache"))
+
     for subset in config.benchmark_subsets:
+        # `shard: "i/n"` and `netlist_indices: "1-50"` split long runs across machines
+        dataset = BenchmarkDataset(
+            subset,
+            indices=config.get("netlist_indices"),
+            shard=config.get("shard"),
+        )
+        # category -> model name -> per-netlist metrics
+        subset_results = {}
         for model_name in eval_models:
-            model = load_llms(model_name)
+            scheduler = get_scheduler(
+                get_provider(model_name), config.get("rate_limits")
+            )
+            model = load_llms(model_name, cache=llm_cache, scheduler=scheduler)
 
             for category in config.categories:
                 llm_output_dir = f"{os.path.join(save_dir, model_name, 'llm_outputs',  category, subset )}"
@@ -200,8 +500,13 @@ def main(config: DictConfig) -> None:
                     "model_name": model_name,
                     "category": category,
                     "llm_output_dir": llm_output_dir,
+                    "shard": config.get("shard"),
+                    "concurrency": get_concurrency(config, model_name),
+                    "resume": config.get("resume", False),
+                    "generation_params": get_generation_params(model),
                 }
 
+                results = None
                 if category.startswith("HL1"):
                     if config.rule_provided:
                         instruction_path = os.path.join(
@@ -216,26 +521,24 @@ def main(config: DictConfig) -> None:
                         prompt = prompt_hl1_direct_prompting_with_instrucion(
                             instruction_src
                         )
-                        result = average_metrics(
-                            find_subcircuits(
-                                subset,
-                                model,
-                                prompts=[prompt],
-                                category=category,
-                                metadata=metadata,
-                            )
+                        results = find_subcircuits(
+                            subset,
+                            model,
+                            prompts=[prompt],
+                            category=category,
+                            metadata=metadata,
+                            dataset=dataset,
                         )
 
                     else:
                         prompt = prompt_hl1_direct_prompting()
-                        result = average_metrics(
-                            find_subcircuits(
-                                subset,
-                                model,
-                                prompts=[prompt],
-                                category=category,
-                                metadata=metadata,
-                            )
+                        results = find_subcircuits(
+                            subset,
+                            model,
+                            prompts=[prompt],
+                            category=category,
+                            metadata=metadata,
+                            dataset=dataset,
                         )
 
                 elif category.startswith("HL2"):
@@ -262,18 +565,17 @@ def main(config: DictConfig) -> None:
                                     prompt_hl2_direct_prompting_single_subcircuit(sc)
                                 )
 
-                        result = average_metrics(
-                            find_subcircuits(
-                                subset,
-                                model,
-                                prompts=prompts,
-                                category=category,
-                                metadata=metadata,
-                            )
+                        results = find_subcircuits(
+                            subset,
+                            model,
+                            prompts=prompts,
+                            category=category,
+                            metadata=metadata,
+                            dataset=dataset,
                         )
                 elif category.startswith("HL3"):
                     if config.rule_provided:
-                        result = None
+                        results = None
                         instruction_path = os.path.join(
                             "outputs",
                             "instruction_generation",
@@ -287,32 +589,57 @@ def main(config: DictConfig) -> None:
                         prompt = prompt_hl3_direct_prompting_multiple_subcircuits_with_instrucion(
                             instruction_src
                         )
-                        result = average_metrics(
-                            find_subcircuits(
-                                subset,
-                                model,
-                                prompts=[prompt],
-                                category=category,
-                                metadata=metadata,
-                            )
+                        results = find_subcircuits(
+                            subset,
+                            model,
+                            prompts=[prompt],
+                            category=category,
+                            metadata=metadata,
+                            dataset=dataset,
                         )
                     else:
                         prompt = prompt_hl3_direct_prompting_multiple_subcircuits()
-                        result = average_metrics(
-                            find_subcircuits(
-                                subset,
-                                model,
-                                prompts=[prompt],
-                                category=category,
-                                metadata=metadata,
-                            )
+                        results = find_subcircuits(
+                            subset,
+                            model,
+                            prompts=[prompt],
+                            category=category,
+                            metadata=metadata,
+                            dataset=dataset,
                         )
 
+                if results is None:
+                    # e.g. HL2 with `break_hl2_prompt: false`: no prompt is defined
+                    logger.warning(
+                        f"no netlist evaluated: model={model_name},subset={subset},category={category}"
+                    )
+                    continue
+                result = {
+                    **average_metrics(results),
+                    **confidence_intervals(results),
+                }
+                subset_results.setdefault(category, {})[model_name] = results
                 content = f"**result**: model={model_name},subset={subset},category={category}:{result}"
                 logger.info(content)
+                if scheduler is not None:
+                    logger.info(f"rate limiter: {scheduler.stats()}")
                 with open(os.path.join(save_dir, model_name, "result.txt"), "a") as fw:
                     fw.write(content + "\n")
 
+        # paired bootstrap of every two models evaluated on the same netlists
+        for category, runs in subset_results.items():
+            for comparison in paired_comparisons(runs):
+                content = (
+                    f"**paired**: subset={subset},category={category}:{comparison}"
+                )
+                logger.info(content)
+                with open(os.path.join(save_dir, "significance.txt"), "a") as fw:
+                    fw.write(content + "\n")
+
+    if llm_cache is not None:
+        logger.info(llm_cache.stats())
+        llm_cache.close()
+
 
 if __name__ == "__main__":
     main()
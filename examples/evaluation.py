@@ -2,7 +2,9 @@ from src.netlist import SPICENetlist
 import glob
 import re
 import json
-from calc1 import compute_cluster_metrics, average_metrics
+from calc1 import average_metrics
+from src.metric_cache import cached_compute_cluster_metrics
+from src.bootstrap import confidence_intervals
 from typing import List, Tuple, Dict, Set, Any
 from collections import defaultdict, deque, Counter
 import itertools
@@ -22,7 +24,7 @@ def code_eval(subsets=["small", "medium", "large"]):
             data = SPICENetlist(f"data/asi-fuboco-test/{subset}/{i}/")
 
             hl1_results.append(
-                compute_cluster_metrics(
+                cached_compute_cluster_metrics(
                     predicted=findSubCircuitHL1(data.netlist), ground_truth=data.hl1_gt
                 )
             )
@@ -32,20 +34,29 @@ def code_eval(subsets=["small", "medium", "large"]):
             invs = findSubCircuitInverter(data.netlist)
             hl2_prediction = cm + dp + invs
             hl2_results.append(
-                compute_cluster_metrics(
+                cached_compute_cluster_metrics(
                     predicted=hl2_prediction, ground_truth=data.hl2_gt
                 )
             )
 
             hl3_results.append(
-                compute_cluster_metrics(
+                cached_compute_cluster_metrics(
                     predicted=findSubCircuitHL3(data.netlist), ground_truth=data.hl3_gt
                 )
             )
 
-        hl1_info[subset] = average_metrics(hl1_results)
-        hl2_info[subset] = average_metrics(hl2_results)
-        hl3_info[subset] = average_metrics(hl3_results)
+        hl1_info[subset] = {
+            **average_metrics(hl1_results),
+            **confidence_intervals(hl1_results),
+        }
+        hl2_info[subset] = {
+            **average_metrics(hl2_results),
+            **confidence_intervals(hl2_results),
+        }
+        hl3_info[subset] = {
+            **average_metrics(hl3_results),
+            **confidence_intervals(hl3_results),
+        }
 
     return hl1_info, hl2_info, hl3_info
 
@@ -5,29 +5,14 @@ import xml.etree.ElementTree as ET
 from collections import defaultdict
 import pandas as pd
 from src.netlist import SPICENetlist
+from src.dataset import BenchmarkDataset
+from src.manifest import Manifest, find_benchmark_netlists
 
 
 def get_rawlabels_statistic(data_path="data/asi-fuboco-test"):
-    instance_counts = defaultdict(int)
-    circuit_counts = defaultdict(set)
-    for dir in ["small", "medium", "large"]:
-
-        for i in range(1, 101):
-            netlist_dir = f"{data_path}/{dir}/{i}/"
-
-            tree = ET.parse(
-                glob.glob(os.path.join(netlist_dir, "structure_result.xml"))[0]
-            )
-            root = tree.getroot()
-            subcircuits = root[1]
-
-            for sc in subcircuits:
-                circuit_name = sc.attrib["name"]
-                circuit_name = circuit_name[: circuit_name.find("[")]
-                circuit_counts[circuit_name].add(netlist_dir)
-                instance_counts[circuit_name] += 1
-
-    return instance_counts, circuit_counts
+    manifest = Manifest()
+    manifest.update(find_benchmark_netlists(data_path))
+    return manifest.subcircuit_statistics(path_glob=f"{data_path}/*")
 
 
 def get_labels_statistic(data_path="data/asi-fuboco-test"):
@@ -35,9 +20,8 @@ def get_labels_statistic(data_path="data/asi-fuboco-test"):
     circuit_counts = defaultdict(set)
     for dir in ["small", "medium", "large"]:
 
-        for i in range(1, 101):
+        for i, data in BenchmarkDataset(dir, data_dir=data_path):
             netlist_dir = f"{data_path}/{dir}/{i}/"
-            data = SPICENetlist(netlist_dir)
 
             # for sc in data.hl2_gt:
             #     subcircuit_name = sc["sub_circuit_name"]
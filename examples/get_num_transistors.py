@@ -1,8 +1,7 @@
 import json
-from src.netlist import SPICENetlist
+from src.dataset import BenchmarkDataset
 
 
 if __name__ == "__main__":
-    for i in range(1, 101, 1):
-        data = SPICENetlist(f"data/asi-fuboco-test/small/{i}/")
+    for i, data in BenchmarkDataset("small"):
         print(i, data.num_transistors)
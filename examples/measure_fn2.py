@@ -1,93 +1,218 @@
 import numpy as np
-from sklearn.metrics import precision_score, recall_score, f1_score
+import scipy.sparse as sp
 from scipy.optimize import linear_sum_assignment
 from collections import defaultdict
-from loguru import logger
-from utils import configure_logging
+from src import tracing
 
-configure_logging(logname="measure_fn2.log", level="INFO")
-logger.info("Starting evaluation of graph clustering...")
 
+def build_indicator_matrices(ground_truth, prediction, classes=None):
+    """
+    Transistor x class indicator matrices of both sides of one netlist.
 
-def evaluate_graph_clustering_class_wise(ground_truth, prediction):
+    Args:
+        classes: column order; defaults to the sorted class names of both sides.
+
+    Returns:
+        Tuple `(transistors, classes, y_true, y_pred)` with boolean matrices of shape
+        `(len(transistors), len(classes))`, rows are every transistor in any cluster.
     """
-    Evaluates graph node classification and clustering with overlapping classes.
-    Transistors may belong to multiple clusters/classes.
+    if classes is None:
+        classes = sorted(
+            set([name for name, _ in ground_truth] + [name for name, _ in prediction])
+        )
+    class_index = {name: j for j, name in enumerate(classes)}
+    transistors = {}
+    for _, components in list(ground_truth) + list(prediction):
+        for t in components:
+            transistors.setdefault(t, len(transistors))
+
+    y_true = np.zeros((len(transistors), len(classes)), dtype=bool)
+    y_pred = np.zeros((len(transistors), len(classes)), dtype=bool)
+    for y, clusters in ((y_true, ground_truth), (y_pred, prediction)):
+        for name, components in clusters:
+            j = class_index.get(name)
+            if j is not None:
+                y[[transistors[t] for t in components], j] = True
+    return list(transistors), classes, y_true, y_pred
+
+
+def stack_indicator_matrices(pairs, classes=None):
+    """
+    Stack the indicator matrices of many `(ground_truth, prediction)` pairs, e.g. every
+    netlist of a sweep, over one shared class list.
 
-    Use this function if you want to evaluate how well the model performs for each class.
-    - If you want to evaluate how well the model performs for each class.
-    - Example: You care about the performance of the model in identifying specific subcircuits like "Inverter" or "CM" across all nodes.
+    Returns:
+        Tuple `(classes, y_true, y_pred, offsets, class_mask)`; rows of pair `i` are
+        `offsets[i] : offsets[i + 1]` and `class_mask[i]` marks the classes named in
+        pair `i` (the classes its per-netlist macro average runs over).
+    """
+    pairs = list(pairs)
+    if classes is None:
+        classes = sorted(
+            {name for gt, pred in pairs for name, _ in list(gt) + list(pred)}
+        )
+    matrices = [build_indicator_matrices(gt, pred, classes)[2:] for gt, pred in pairs]
+    offsets = np.zeros(len(matrices) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(y_true) for y_true, _ in matrices])
+    empty = np.zeros((0, len(classes)), dtype=bool)
+    y_true = np.concatenate([m[0] for m in matrices] or [empty])
+    y_pred = np.concatenate([m[1] for m in matrices] or [empty])
+    class_index = {name: j for j, name in enumerate(classes)}
+    class_mask = np.zeros((len(pairs), len(classes)), dtype=bool)
+    for i, (gt, pred) in enumerate(pairs):
+        for name, _ in list(gt) + list(pred):
+            if name in class_index:
+                class_mask[i, class_index[name]] = True
+    return classes, y_true, y_pred, offsets, class_mask
+
+
+def _segment_sum(x, offsets):
+    """Row sums of `x` per segment `offsets[i] : offsets[i + 1]` (empty segments give 0)."""
+    cumsum = np.zeros((len(x) + 1,) + x.shape[1:], dtype=np.float64)
+    np.cumsum(x, axis=0, out=cumsum[1:])
+    return cumsum[offsets[1:]] - cumsum[offsets[:-1]]
+
+
+def _divide(numerator, denominator):
+    """Elementwise division with 0 where the denominator is 0 (`zero_division=0`)."""
+    out = np.zeros(np.broadcast(numerator, denominator).shape, dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def _f1(precision, recall):
+    return _divide(2 * precision * recall, precision + recall)
+
+
+def multilabel_scores(y_true, y_pred, offsets=None, class_mask=None) -> dict:
+    """
+    Multi-label P/R/F1 of stacked transistor x class indicator matrices.
+
+    For every segment (netlist) this computes, with array operations only:
+        - `macro_*`: per-class binary scores averaged over the classes of the segment
+          (same as `precision_score`/`recall_score`/`f1_score` per class); a class
+          without any transistor, e.g. of an empty predicted cluster, scores 0
+        - `micro_*`: scores of the pooled true/false positives of all classes
+        - `node_*`: per-transistor scores averaged over the transistors of the segment
 
     Args:
-        ground_truth: List of tuppes with the first element is subcircuit names, and component/transistor names as the second element'
-        prediction: List of tuppes with the first element is subcircuit names, and component/transistor names as the second element'
+        offsets: segment boundaries as returned by `stack_indicator_matrices`;
+            the whole matrix is one segment if not given.
+        class_mask: `(segments, classes)` booleans selecting the classes averaged by
+            `macro_*` (see `stack_indicator_matrices`); all columns if not given.
 
     Returns:
-        Dictionary with classification (node-level) and clustering (cluster-level) metrics
+        Dictionary of float arrays with one entry per segment.
     """
-    # Convert to sets for clustering
-    gt_clusters = [(sc, set(components)) for sc, components in ground_truth]
-    pred_clusters = [(sc, set(components)) for sc, components in prediction]
-
-    # Node classification: map transistors to their set of classes
-    gt_node_labels = defaultdict(set)
-    for name, transistors in gt_clusters:
-        for t in transistors:
-            gt_node_labels[t].add(name)
-
-    pred_node_labels = defaultdict(set)
-    for name, transistors in pred_clusters:
-        for t in transistors:
-            pred_node_labels[t].add(name)
-
-    logger.debug(f"Ground truth node labels: {gt_node_labels=}")
-    logger.debug(f"Predicted node labels: {pred_node_labels=}")
-    # Node-level classification metrics
-    all_transistors = set(gt_node_labels.keys()) | set(pred_node_labels.keys())
-    classes = sorted(
-        set([name for name, _ in gt_clusters] + [name for name, _ in pred_clusters])
+    y_true = np.asarray(y_true, dtype=bool)
+    y_pred = np.asarray(y_pred, dtype=bool)
+    if offsets is None:
+        offsets = np.array([0, len(y_true)])
+    true_positive = y_true & y_pred
+
+    # (segments, classes) counts
+    tp = _segment_sum(true_positive, offsets)
+    num_true = _segment_sum(y_true, offsets)
+    num_pred = _segment_sum(y_pred, offsets)
+    if class_mask is None:
+        class_mask = np.ones(tp.shape, dtype=bool)
+    num_classes = class_mask.sum(axis=1)
+
+    class_precision = _divide(tp, num_pred)
+    class_recall = _divide(tp, num_true)
+    class_f1 = _f1(class_precision, class_recall)
+
+    scores = {}
+    for name, values in (
+        ("precision", class_precision),
+        ("recall", class_recall),
+        ("f1", class_f1),
+    ):
+        scores[f"macro_{name}"] = _divide(
+            (values * class_mask).sum(axis=1), num_classes
+        )
+
+    scores["micro_precision"] = _divide(tp.sum(axis=1), num_pred.sum(axis=1))
+    scores["micro_recall"] = _divide(tp.sum(axis=1), num_true.sum(axis=1))
+    scores["micro_f1"] = _f1(scores["micro_precision"], scores["micro_recall"])
+
+    # node-wise: every transistor appearing on either side counts once
+    node_tp = true_positive.sum(axis=1)
+    node_precision = _divide(node_tp, y_pred.sum(axis=1))
+    node_recall = _divide(node_tp, y_true.sum(axis=1))
+    is_node = y_true.any(axis=1) | y_pred.any(axis=1)
+    num_nodes = _segment_sum(is_node, offsets)
+    for name, values in (
+        ("precision", node_precision),
+        ("recall", node_recall),
+        ("f1", _f1(node_precision, node_recall)),
+    ):
+        scores[f"node_{name}"] = _divide(
+            _segment_sum(values * is_node, offsets), num_nodes
+        )
+    return scores
+
+
+def get_transistor_index(*cluster_lists) -> dict:
+    """Column index of every transistor appearing in any of the cluster lists."""
+    transistor_index = {}
+    for clusters in cluster_lists:
+        for _, components in clusters:
+            for t in components:
+                transistor_index.setdefault(t, len(transistor_index))
+    return transistor_index
+
+
+def cluster_incidence(clusters, transistor_index) -> sp.csr_matrix:
+    """Sparse 0/1 cluster x transistor incidence matrix (duplicate members count once)."""
+    indptr = [0]
+    indices = []
+    for _, components in clusters:
+        columns = {transistor_index[t] for t in components}
+        indices.extend(sorted(columns))
+        indptr.append(len(indices))
+    return sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.int64), indices, indptr),
+        shape=(len(clusters), len(transistor_index)),
     )
-    logger.debug(f"All classes: {classes=}")
-
-    # Binary classification per class (multi-label)
-    node_precision_scores = []
-    node_recall_scores = []
-    node_f1_scores = []
-
-    for cls in classes:
-        logger.debug(f"Evaluating class: {cls=}")
-        y_true = []
-        y_pred = []
-        for t in all_transistors:
-            y_true.append(1 if cls in gt_node_labels.get(t, set()) else 0)
-            y_pred.append(1 if cls in pred_node_labels.get(t, set()) else 0)
-        node_precision_scores.append(precision_score(y_true, y_pred, zero_division=0))
-        node_recall_scores.append(recall_score(y_true, y_pred, zero_division=0))
-        node_f1_scores.append(f1_score(y_true, y_pred, zero_division=0))
-
-    # Average metrics across classes (macro averaging)
-    logger.debug(f"Node-level precision scores: {node_precision_scores=}")
-    node_precision = np.mean(node_precision_scores) if node_precision_scores else 0
-    node_recall = np.mean(node_recall_scores) if node_recall_scores else 0
-    node_f1 = np.mean(node_f1_scores) if node_f1_scores else 0
 
-    # Cluster-level metrics: match clusters based on transistor overlap
-    overlap_matrix = np.zeros((len(gt_clusters), len(pred_clusters)))
-    for i, (_, gt_transistors) in enumerate(gt_clusters):
-        for j, (_, pred_transistors) in enumerate(pred_clusters):
-            overlap_matrix[i, j] = len(gt_transistors & pred_transistors)
 
-    # Optimal cluster assignment using Hungarian algorithm
+def cluster_overlap_matrix(ground_truth, prediction, transistor_index=None):
+    """`overlap[i, j] = |gt_i & pred_j|`, computed as a product of sparse incidence matrices."""
+    if transistor_index is None:
+        transistor_index = get_transistor_index(ground_truth, prediction)
+    gt_incidence = cluster_incidence(ground_truth, transistor_index)
+    pred_incidence = cluster_incidence(prediction, transistor_index)
+    return (gt_incidence @ pred_incidence.T).toarray().astype(np.float64)
+
+
+def match_clusters(ground_truth, prediction, transistor_index=None) -> dict:
+    """
+    Cluster-level scores: match ground-truth and predicted clusters one-to-one with the
+    Hungarian algorithm (maximizing transistor overlap) and count the overlap of
+    matched pairs with the same subcircuit name as correct.
+
+    Args:
+        transistor_index: shared column index (see `get_transistor_index`), e.g. built
+            once for all levels of a netlist.
+    """
+    return score_cluster_matching(
+        cluster_overlap_matrix(ground_truth, prediction, transistor_index),
+        ground_truth,
+        prediction,
+    )
+
+
+def score_cluster_matching(overlap_matrix, ground_truth, prediction) -> dict:
+    """`match_clusters` from an already computed `cluster_overlap_matrix`."""
     row_ind, col_ind = linear_sum_assignment(-overlap_matrix)  # Maximize overlap
-    cluster_correct = 0
-    cluster_total_gt = sum(len(t) for _, t in gt_clusters)
-    cluster_total_pred = sum(len(t) for _, t in pred_clusters)
 
-    for gt_idx, pred_idx in zip(row_ind, col_ind):
-        gt_name, gt_transistors = gt_clusters[gt_idx]
-        pred_name, pred_transistors = pred_clusters[pred_idx]
-        if gt_name == pred_name:
-            cluster_correct += overlap_matrix[gt_idx, pred_idx]
+    gt_names = np.array([name for name, _ in ground_truth], dtype=object)
+    pred_names = np.array([name for name, _ in prediction], dtype=object)
+    same_name = gt_names[row_ind] == pred_names[col_ind]
+    cluster_correct = overlap_matrix[row_ind, col_ind][same_name].sum()
+    cluster_total_gt = sum(len(set(t)) for _, t in ground_truth)
+    cluster_total_pred = sum(len(set(t)) for _, t in prediction)
 
     cluster_precision = (
         cluster_correct / cluster_total_pred if cluster_total_pred > 0 else 0
@@ -98,7 +223,38 @@ def evaluate_graph_clustering_class_wise(ground_truth, prediction):
         if (cluster_precision + cluster_recall) > 0
         else 0
     )
+    return {
+        "cluster_precision": cluster_precision,
+        "cluster_recall": cluster_recall,
+        "cluster_f1": cluster_f1,
+        "cluster_correct_transistors": int(cluster_correct),
+        "cluster_total_predicted": cluster_total_pred,
+        "cluster_total_actual": cluster_total_gt,
+    }
+
+
+def match_clusters_across_levels(levels: dict) -> dict:
+    """
+    `match_clusters` for every level of one netlist, e.g.
+    `{"HL1": (hl1_gt, hl1_pred), "HL2": (...), "HL3": (...)}`, over one transistor index.
+    """
+    transistor_index = get_transistor_index(
+        *(clusters for pair in levels.values() for clusters in pair)
+    )
+    return {
+        level: match_clusters(ground_truth, prediction, transistor_index)
+        for level, (ground_truth, prediction) in levels.items()
+    }
+
 
+def clustering_report(scores: dict, average: str, cluster_scores: dict) -> dict:
+    """
+    Result of the `evaluate_graph_clustering_*` functions: the `average` ("macro" or
+    "node") scores of `multilabel_scores` plus the `match_clusters` scores.
+    """
+    node_precision = float(scores[f"{average}_precision"][0])
+    node_recall = float(scores[f"{average}_recall"][0])
+    node_f1 = float(scores[f"{average}_f1"][0])
     return {
         "node_precision": node_precision,
         "node_recall": node_recall,
@@ -106,15 +262,61 @@ def evaluate_graph_clustering_class_wise(ground_truth, prediction):
         "Precision": node_precision,
         "Recall": node_recall,
         "F1-score": node_f1,
-        "cluster_precision": cluster_precision,
-        "cluster_recall": cluster_recall,
-        "cluster_f1": cluster_f1,
-        "cluster_correct_transistors": int(cluster_correct),
-        "cluster_total_predicted": cluster_total_pred,
-        "cluster_total_actual": cluster_total_gt,
+        **cluster_scores,
     }
 
 
+def trace_node_labels(transistors, classes, y_true, y_pred):
+    tracing.emit(
+        "node_labels",
+        transistors=transistors,
+        classes=classes,
+        gt=y_true.tolist(),
+        predicted=y_pred.tolist(),
+    )
+
+
+def trace_nodes(transistors, classes, y_true, y_pred):
+    for t, true_row, pred_row in zip(transistors, y_true, y_pred):
+        tracing.emit(
+            "node",
+            transistor=t,
+            true_classes=[c for c, y in zip(classes, true_row) if y],
+            predicted_classes=[c for c, y in zip(classes, pred_row) if y],
+            true_positive=int((true_row & pred_row).sum()),
+        )
+
+
+def evaluate_graph_clustering_class_wise(ground_truth, prediction):
+    """
+    Evaluates graph node classification and clustering with overlapping classes.
+    Transistors may belong to multiple clusters/classes.
+
+    Use this function if you want to evaluate how well the model performs for each class.
+    - If you want to evaluate how well the model performs for each class.
+    - Example: You care about the performance of the model in identifying specific subcircuits like "Inverter" or "CM" across all nodes.
+
+    Args:
+        ground_truth: List of tuppes with the first element is subcircuit names, and component/transistor names as the second element'
+        prediction: List of tuppes with the first element is subcircuit names, and component/transistor names as the second element'
+
+    Returns:
+        Dictionary with classification (node-level) and clustering (cluster-level) metrics
+    """
+    # Binary classification per class (multi-label), averaged across classes (macro)
+    transistors, classes, y_true, y_pred = build_indicator_matrices(
+        ground_truth, prediction
+    )
+    if tracing.enabled:
+        trace_node_labels(transistors, classes, y_true, y_pred)
+    scores = multilabel_scores(y_true, y_pred)
+
+    # Cluster-level metrics: match clusters based on transistor overlap
+    cluster_scores = match_clusters(ground_truth, prediction)
+
+    return clustering_report(scores, "macro", cluster_scores)
+
+
 def evaluate_graph_clustering_node_wise(ground_truth, prediction):
     """
     Evaluates graph node classification and clustering with overlapping classes.
@@ -131,97 +333,19 @@ def evaluate_graph_clustering_node_wise(ground_truth, prediction):
     Returns:
         Dictionary with classification (node-level) and clustering (cluster-level) metrics.
     """
-    # Convert to sets for clustering
-    gt_clusters = [(sc, set(components)) for sc, components in ground_truth]
-    pred_clusters = [(sc, set(components)) for sc, components in prediction]
-
-    # Node classification: map transistors to their set of classes
-    gt_node_labels = defaultdict(set)
-    for name, transistors in gt_clusters:
-        for t in transistors:
-            gt_node_labels[t].add(name)
-
-    pred_node_labels = defaultdict(set)
-    for name, transistors in pred_clusters:
-        for t in transistors:
-            pred_node_labels[t].add(name)
-
-    # Node-wise metrics
-    all_transistors = set(gt_node_labels.keys()) | set(pred_node_labels.keys())
-    node_precisions = []
-    node_recalls = []
-    node_f1s = []
-
     # multi-label classification
-    # Calculate precision, recall, and F1 for each node
-    # The aggregation is done by averaging the metrics across all nodes.
-    for t in all_transistors:
-        true_classes = gt_node_labels.get(t, set())
-        pred_classes = pred_node_labels.get(t, set())
-
-        # Calculate precision, recall, and F1 for the node
-        true_positive = len(true_classes & pred_classes)
-        logger.debug(
-            f"Node {t}: true classes: {true_classes}, predicted classes: {pred_classes}, true positive: {true_positive}"
-        )
-        precision = true_positive / len(pred_classes) if pred_classes else 0
-        recall = true_positive / len(true_classes) if true_classes else 0
-        f1 = (
-            2 * precision * recall / (precision + recall)
-            if (precision + recall) > 0
-            else 0
-        )
-
-        node_precisions.append(precision)
-        node_recalls.append(recall)
-        node_f1s.append(f1)
-
-    # Average metrics across all nodes
-    node_precision = np.mean(node_precisions) if node_precisions else 0
-    node_recall = np.mean(node_recalls) if node_recalls else 0
-    node_f1 = np.mean(node_f1s) if node_f1s else 0
-
-    # Cluster-level metrics (unchanged)
-    overlap_matrix = np.zeros((len(gt_clusters), len(pred_clusters)))
-    for i, (_, gt_transistors) in enumerate(gt_clusters):
-        for j, (_, pred_transistors) in enumerate(pred_clusters):
-            overlap_matrix[i, j] = len(gt_transistors & pred_transistors)
-
-    row_ind, col_ind = linear_sum_assignment(-overlap_matrix)  # Maximize overlap
-    cluster_correct = 0
-    cluster_total_gt = sum(len(t) for _, t in gt_clusters)
-    cluster_total_pred = sum(len(t) for _, t in pred_clusters)
-
-    for gt_idx, pred_idx in zip(row_ind, col_ind):
-        gt_name, gt_transistors = gt_clusters[gt_idx]
-        pred_name, pred_transistors = pred_clusters[pred_idx]
-        if gt_name == pred_name:
-            cluster_correct += overlap_matrix[gt_idx, pred_idx]
-
-    cluster_precision = (
-        cluster_correct / cluster_total_pred if cluster_total_pred > 0 else 0
-    )
-    cluster_recall = cluster_correct / cluster_total_gt if cluster_total_gt > 0 else 0
-    cluster_f1 = (
-        2 * cluster_precision * cluster_recall / (cluster_precision + cluster_recall)
-        if (cluster_precision + cluster_recall) > 0
-        else 0
+    # precision, recall, and F1 of each node, averaged across all nodes.
+    transistors, classes, y_true, y_pred = build_indicator_matrices(
+        ground_truth, prediction
     )
+    if tracing.enabled:
+        trace_nodes(transistors, classes, y_true, y_pred)
+    scores = multilabel_scores(y_true, y_pred)
 
-    return {
-        "node_precision": node_precision,
-        "node_recall": node_recall,
-        "node_f1": node_f1,
-        "Precision": node_precision,
-        "Recall": node_recall,
-        "F1-score": node_f1,
-        "cluster_precision": cluster_precision,
-        "cluster_recall": cluster_recall,
-        "cluster_f1": cluster_f1,
-        "cluster_correct_transistors": int(cluster_correct),
-        "cluster_total_predicted": cluster_total_pred,
-        "cluster_total_actual": cluster_total_gt,
-    }
+    # Cluster-level metrics
+    cluster_scores = match_clusters(ground_truth, prediction)
+
+    return clustering_report(scores, "node", cluster_scores)
 
 
 def compute_cluster_metrics_v2(predicted, ground_truth):
@@ -240,19 +364,21 @@ def create_confusion_matrix(ground_truth, prediction):
         A confusion matrix as a dictionary where keys are ground truth subcircuit names and values are dictionaries
         mapping predicted subcircuit names to the count of overlapping transistors.
     """
-    # Convert to sets for clustering
-    gt_clusters = [(sc, set(components)) for sc, components in ground_truth]
-    pred_clusters = [(sc, set(components)) for sc, components in prediction]
+    return confusion_from_overlap(
+        cluster_overlap_matrix(ground_truth, prediction), ground_truth, prediction
+    )
 
+
+def confusion_from_overlap(overlap_matrix, ground_truth, prediction):
+    """`create_confusion_matrix` from an already computed `cluster_overlap_matrix`."""
     # Initialize confusion matrix
     confusion_matrix = defaultdict(lambda: defaultdict(int))
 
-    # Populate confusion matrix
-    for gt_name, gt_transistors in gt_clusters:
-        for pred_name, pred_transistors in pred_clusters:
-            overlap = len(gt_transistors & pred_transistors)
-            if overlap > 0:
-                confusion_matrix[gt_name][pred_name] += overlap
+    # Populate confusion matrix from the non-zero cluster overlaps
+    for i, j in zip(*np.nonzero(overlap_matrix)):
+        confusion_matrix[ground_truth[i][0]][prediction[j][0]] += int(
+            overlap_matrix[i, j]
+        )
 
     return confusion_matrix
 
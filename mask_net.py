@@ -1,83 +1,102 @@
-import glob
-import os
+from src.zip_dataset import open_file, glob_files
 # PATH = glob.glob("data/netlist1/*.ckt")[0]
 
 # print (PATH)
 
-def mask_net(netlist_path, use_meaninful_token=False):
-    netid = 97 if use_meaninful_token else 1
+# nets that keep their name in the masked netlist
+preserved_nets = {"nmos", "pmos", "ibias", "vref", "in1", "in2", "out", "out1", "out2"}
+
+
+def get_net_name(netid, use_meaninful_token=False):
+    """
+    Name of the `netid`-th masked net (0-based).
+
+    With `use_meaninful_token`, nets are named a, b, ..., z, aa, ab, ... (bijective base 26),
+    otherwise net1, net2, ...
+    """
+    if not use_meaninful_token:
+        return f"net{netid + 1}"
+    name = ""
+    netid += 1
+    while netid > 0:
+        netid, remainder = divmod(netid - 1, 26)
+        name = chr(97 + remainder) + name
+    return name
+
+
+def is_reserved_net_name(name):
+    # generated names must never look like a preserved or supply net, since the
+    # prompts and the rule-based detectors match on e.g. `in*` / `out*` prefixes
+    return (
+        name in preserved_nets
+        or name in ("ground", "supply", "gnd", "vdd")
+        or name.startswith(("in", "out"))
+    )
+
+
+def mask_netlist(netlist_path, use_meaninful_token=False):
+    """
+    Mask the internal net names of a SPICE netlist in a single linear pass.
+
+    Returns:
+        Tuple `(spice_content, mapping, reverse_mapping)` where `mapping` maps original
+        net names to masked ones and `reverse_mapping` maps them back, e.g. to translate
+        nets mentioned in LLM predictions to the original netlist.
+    """
+    ground = "ground" if use_meaninful_token else "gnd!"
+    supply = "supply" if use_meaninful_token else "vdd!"
+    supply_nets = {"sourceNmos": ground, "sourcePmos": supply}
     mapping = {}
-    spice_content = ""
-    with open(netlist_path, "r") as f:
+    reverse_mapping = {}
+    netid = 0
+    lines = []
+    with open_file(netlist_path, "r") as f:
         for line in f:
             line = line.strip()
             if line.startswith(".suckt") or line.startswith(".SUBCKT") or line.startswith(".end "):
                 continue
-            
+
             connection_info = line.split()
-            if len(connection_info) > 3:
-                #continue
-                # print (line)
-                new_line = connection_info[0] + " "
-                for i in range(1, len(connection_info)):
-                    if connection_info[i] == "sourceNmos":
-                        if use_meaninful_token:
-                            new_line += "ground" + " "
-                        else:
-                            new_line += "gnd!" + " "
-
-                    elif connection_info[i] == "sourcePmos":
-                        if use_meaninful_token:
-                            new_line += "supply" + " "
-                        else:
-                            new_line += "vdd!" + " "
-                    elif connection_info[i] in ["nmos", "pmos", "ibias", "vref", "in1", "in2", "out", "out1", "out2"]:
-                        new_line += connection_info[i] + " "
-                    elif connection_info[i] not in mapping:
-                        
-                        mapping[connection_info[i]] = f"net{netid}" if not use_meaninful_token else chr(netid)#
-                        netid += 1 
-                        new_line += mapping[connection_info[i]] + " "
-                    else:
-                        new_line += mapping[connection_info[i]] + " "
-
-
-            elif len(connection_info) == 3:
-                new_line = connection_info[0] + " "
-                for i in range(1, len(connection_info)):
-                    if connection_info[i] in ["nmos", "pmos", "ibias", "vref", "in1", "in2", "out", "out1", "out2"]:
-                        new_line += connection_info[i] + " "
-
-                    elif connection_info[i] == "sourceNmos":
-                        if use_meaninful_token:
-                            new_line += "ground" + " "
-                        else:
-                            new_line += "gnd!" + " "
-
-                    elif connection_info[i] == "sourcePmos":
-                        if use_meaninful_token:
-                            new_line += "supply" + " "
-                        else:
-                            new_line += "vdd!" + " "
-
-                    elif connection_info[i] not in mapping:
-                        mapping[connection_info[i]] = f"net{netid}" if not use_meaninful_token else chr(netid)#
-                        netid += 1 
-                        new_line += mapping[connection_info[i]] + " "
+            if len(connection_info) < 3:
+                lines.append(line)
+                continue
+
+            new_line = [connection_info[0]]
+            for net in connection_info[1:]:
+                if net in preserved_nets:
+                    new_line.append(net)
+                    continue
+                masked = mapping.get(net)
+                if masked is None:
+                    if net in supply_nets:
+                        masked = supply_nets[net]
                     else:
-                        new_line += mapping[connection_info[i]] + " "
-            else:
-                new_line = line
-            
-            new_line = new_line.strip()
-            # print (new_line)
-            spice_content += new_line + "\n"
-    
-    return spice_content
+                        masked = get_net_name(netid, use_meaninful_token)
+                        netid += 1
+                        while is_reserved_net_name(masked):
+                            masked = get_net_name(netid, use_meaninful_token)
+                            netid += 1
+                    mapping[net] = masked
+                    reverse_mapping[masked] = net
+                new_line.append(masked)
+            lines.append(" ".join(new_line))
+
+    spice_content = "".join(l + "\n" for l in lines)
+    return spice_content, mapping, reverse_mapping
+
+
+def mask_net(netlist_path, use_meaninful_token=False):
+    return mask_netlist(netlist_path, use_meaninful_token)[0]
+
 
 def get_masked_netlist(netlist_path, use_meaninful_token=True):
-    PATH = glob.glob(os.path.join(netlist_path, "*.ckt"))[0]
+    PATH = glob_files(netlist_path, "*.ckt")[0]
     return mask_net(PATH, use_meaninful_token)
+
+
+def get_masked_netlist_with_mapping(netlist_path, use_meaninful_token=True):
+    PATH = glob_files(netlist_path, "*.ckt")[0]
+    return mask_netlist(PATH, use_meaninful_token)
 # mask_net(PATH, use_meaninful_token=True)
 
 if __name__ == "__main__":
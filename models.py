@@ -4,12 +4,15 @@ from langchain_openai import ChatOpenAI
 from langchain_openai.chat_models.base import BaseChatOpenAI
 from google import genai
 
+from src.llm_cache import LLMResponseCache, CachedChatModel, get_generation_params
+from src.rate_limit import ProviderScheduler, RateLimitedChatModel
+
 
 def load_ollama(model_name="deepseek-r1:70b"):
     return ChatOllama(model=model_name, temperature=0.0, max_tokens=4096, device=0)
 
 
-def load_openai(model_name="gpt-4o"):
+def load_openai(model_name="gpt-4o", max_retries=2):
     openai_api_key = os.getenv("OPENAI_API_KEY", None)
     if openai_api_key is None:
         raise ValueError("OPENAI_API_KEY environment variable is not set")
@@ -19,12 +22,12 @@ def load_openai(model_name="gpt-4o"):
         temperature=0,
         max_tokens=4096,
         timeout=None,
-        max_retries=2,
+        max_retries=max_retries,
         api_key=openai_api_key,
     )
 
 
-def load_xai(model_name="grok-3-beta"):
+def load_xai(model_name="grok-3-beta", max_retries=2):
     xai_api_key = os.getenv("XAI_API_KEY", None)
     if xai_api_key is None:
         raise ValueError("XAI_API_KEY environment variable is not set")
@@ -34,11 +37,12 @@ def load_xai(model_name="grok-3-beta"):
         openai_api_key=xai_api_key,
         openai_api_base="https://api.x.ai/v1",
         max_tokens=4096,
+        max_retries=max_retries,
     )
     return model
 
 
-def load_deepseek(model_name="deepseek-reasoner"):
+def load_deepseek(model_name="deepseek-reasoner", max_retries=2):
     deepseek_api_key = os.getenv("DEEPSEEK_API_KEY", None)
     if deepseek_api_key is None:
         raise ValueError("DEEPSEEK_API_KEY environment variable is not set")
@@ -48,6 +52,7 @@ def load_deepseek(model_name="deepseek-reasoner"):
         openai_api_key=deepseek_api_key,
         openai_api_base="https://api.deepseek.com",
         max_tokens=4096,
+        max_retries=max_retries,
     )
     return model
 
@@ -65,15 +70,57 @@ class google_genai_model:
         return response.text
 
 
-def load_llms(model_name: str):
+# model name prefix -> provider, in the order `load_llms` dispatches on them
+PROVIDER_PREFIXES = {
+    "deepseek": "deepseek",
+    "gpt": "openai",
+    "llama": "ollama",
+    "grok": "xai",
+    "ai_studio_gemini": "google",
+}
+
+
+def get_provider(model_name: str) -> str:
+    """Provider serving `model_name`, e.g. to share limits between its models."""
+    for prefix, provider in PROVIDER_PREFIXES.items():
+        if model_name.startswith(prefix):
+            return provider
+    raise NotImplementedError("not found model name")
+
+
+def load_llms(
+    model_name: str,
+    cache: LLMResponseCache = None,
+    scheduler: ProviderScheduler = None,
+    max_retries: int = 2,
+):
+    """
+    Args:
+        cache: serve repeated requests from this response cache (see `CachedChatModel`).
+        scheduler: rate limiter the requests that miss the cache go through.
+        max_retries: retries of the OpenAI-compatible clients themselves; 0 with a
+            `scheduler`, so that every 429 reaches its AIMD control and backoff.
+    """
+    if cache is not None or scheduler is not None:
+        model = load_llms(
+            model_name, max_retries=0 if scheduler is not None else max_retries
+        )
+        params = get_generation_params(model)
+        if scheduler is not None:
+            model = RateLimitedChatModel(model, scheduler)
+        if cache is not None:
+            model = CachedChatModel(
+                model, get_provider(model_name), model_name, cache, params
+            )
+        return model
     if model_name.startswith("deepseek"):
-        return load_deepseek(model_name)
+        return load_deepseek(model_name, max_retries)
     if model_name.startswith("gpt"):
-        return load_openai(model_name)
+        return load_openai(model_name, max_retries)
     if model_name.startswith("llama"):
         return load_ollama(model_name)
     if model_name.startswith("grok"):
-        return load_xai(model_name)
+        return load_xai(model_name, max_retries)
     if model_name.startswith("ai_studio_gemini"):
         return google_genai_model()
     raise NotImplementedError("not found model name")
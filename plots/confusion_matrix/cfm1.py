@@ -2,18 +2,27 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import pandas as pd
+import os
+import sys
 
-# Define confusion matrices for each hierarchy level
+from src.confusion_matrix import load_confusion_matrices
+
+# Confusion matrices saved by `save_confusion_matrices` (see `code_eval`),
+# e.g. python plots/confusion_matrix/cfm1.py outputs/<result_dir>/confusion_matrices.json
+cfm_path = (
+    sys.argv[1]
+    if len(sys.argv) > 1
+    else os.path.join(os.path.dirname(__file__), "cfm-v1.json")
+)
+matrices = load_confusion_matrices(cfm_path)
 
 # HL1
 hl1_labels = ["MosfetDiode", "load_cap", "compensation_cap"]
-hl1_matrix = np.array([[1952, 0, 0], [0, 215, 0], [0, 0, 405]])
+hl1_matrix = matrices["HL1"].as_array(hl1_labels)
 
 # HL2
 hl2_labels = ["CM", "Inverter", "DiffPair"]
-hl2_matrix = np.array(
-    [[4241, 451, 14], [1120, 687, 51], [10, 20, 260]]  # CM  # Inverter  # DiffPair
-)
+hl2_matrix = matrices["HL2"].as_array(hl2_labels)
 
 # HL3
 hl3_labels = [
@@ -24,16 +33,7 @@ hl3_labels = [
     "biasPart",
     "feedBack",
 ]
-hl3_matrix = np.array(
-    [
-        [600, 0, 0, 0, 20, 0],  # firstStage
-        [0, 109, 0, 0, 659, 0],  # secondStage
-        [0, 55, 0, 0, 100, 0],  # thirdStage
-        [0, 35, 0, 763, 592, 0],  # loadPart
-        [0, 181, 0, 0, 3749, 0],  # biasPart
-        [0, 0, 0, 0, 340, 0],  # feedBack
-    ]
-)
+hl3_matrix = matrices["HL3"].as_array(hl3_labels)
 
 # Plotting
 fig, axs = plt.subplots(1, 3, figsize=(18, 5))
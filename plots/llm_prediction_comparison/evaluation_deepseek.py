@@ -1,7 +1,10 @@
 from src.netlist import SPICENetlist
+from src.dataset import BenchmarkDataset
 import glob
 import json
-from calc1 import compute_cluster_metrics, average_metrics
+from calc1 import average_metrics
+from src.metric_cache import cached_compute_cluster_metrics
+from src.bootstrap import confidence_intervals
 from typing import List, Any
 
 from typing import List, Tuple, Dict, Set
@@ -619,11 +622,10 @@ def code_eval(subsets=["small", "medium", "large"]):
         hl2_results = []
         hl3_results = []
 
-        for i in range(1, 101):
-            data = SPICENetlist(f"data/asi-fuboco-test/{subset}/{i}/")
+        for i, data in BenchmarkDataset(subset):
 
             hl1_results.append(
-                compute_cluster_metrics(
+                cached_compute_cluster_metrics(
                     predicted=findSubCircuitHL1(data.netlist), ground_truth=data.hl1_gt
                 )
             )
@@ -633,20 +635,29 @@ def code_eval(subsets=["small", "medium", "large"]):
             invs = findSubCircuitInverter(data.netlist)
             hl2_prediction = cm + dp + invs
             hl2_results.append(
-                compute_cluster_metrics(
+                cached_compute_cluster_metrics(
                     predicted=hl2_prediction, ground_truth=data.hl2_gt
                 )
             )
 
             hl3_results.append(
-                compute_cluster_metrics(
+                cached_compute_cluster_metrics(
                     predicted=findSubCircuitHL3(data.netlist), ground_truth=data.hl3_gt
                 )
             )
 
-        hl1_info[subset] = average_metrics(hl1_results)
-        hl2_info[subset] = average_metrics(hl2_results)
-        hl3_info[subset] = average_metrics(hl3_results)
+        hl1_info[subset] = {
+            **average_metrics(hl1_results),
+            **confidence_intervals(hl1_results),
+        }
+        hl2_info[subset] = {
+            **average_metrics(hl2_results),
+            **confidence_intervals(hl2_results),
+        }
+        hl3_info[subset] = {
+            **average_metrics(hl3_results),
+            **confidence_intervals(hl3_results),
+        }
 
     return hl1_info, hl2_info, hl3_info
 
@@ -658,7 +669,7 @@ def code_single_eval(data: SPICENetlist):
     hl3_results = []
 
     hl1_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL1(data.netlist), ground_truth=data.hl1_gt
         )
     )
@@ -668,11 +679,13 @@ def code_single_eval(data: SPICENetlist):
     invs = findSubCircuitInverter(data.netlist)
     hl2_prediction = cm + dp + invs
     hl2_results.append(
-        compute_cluster_metrics(predicted=hl2_prediction, ground_truth=data.hl2_gt)
+        cached_compute_cluster_metrics(
+            predicted=hl2_prediction, ground_truth=data.hl2_gt
+        )
     )
 
     hl3_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL3(data.netlist), ground_truth=data.hl3_gt
         )
     )
@@ -685,7 +698,7 @@ def prediction(data: SPICENetlist):
     hl3_results = []
 
     hl1_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL1(data.netlist), ground_truth=data.hl1_gt
         )
     )
@@ -695,11 +708,13 @@ def prediction(data: SPICENetlist):
     invs = findSubCircuitInverter(data.netlist)
     hl2_prediction = cm + dp + invs
     hl2_results.append(
-        compute_cluster_metrics(predicted=hl2_prediction, ground_truth=data.hl2_gt)
+        cached_compute_cluster_metrics(
+            predicted=hl2_prediction, ground_truth=data.hl2_gt
+        )
     )
 
     hl3_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL3(data.netlist), ground_truth=data.hl3_gt
         )
     )
@@ -1,12 +1,19 @@
 from src.netlist import SPICENetlist
+from src.dataset import BenchmarkDataset
+from src.confusion_matrix import (
+    ConfusionMatrix,
+    merge_confusion_matrices,
+    save_confusion_matrices,
+)
 import glob
 import json
-from calc1 import compute_cluster_metrics, average_metrics
+from calc1 import average_metrics
+from src.metric_cache import cached_compute_cluster_metrics, get_metric_cache
+from src.bootstrap import confidence_intervals
+from src.evaluation_context import EvaluationContext
 from examples.measure_fn2 import (
     evaluate_graph_clustering_node_wise,
     evaluate_graph_clustering_class_wise,
-    create_confusion_matrix,
-    aggregate_confusion_matrices,
 )
 from typing import List, Any
 
@@ -556,49 +563,62 @@ def code_eval(subsets=["small", "medium", "large"]):
         hl2_results = []
         hl3_results = []
 
-        hl1_cf_matries = []
-        hl2_cf_matries = []
-        hl3_cf_matries = []
+        subset_cfm = {level: ConfusionMatrix(level) for level in ["HL1", "HL2", "HL3"]}
 
-        for i in range(1, 101):
-            data = SPICENetlist(f"data/asi-fuboco-test/{subset}/{i}/")
+        for i, data in BenchmarkDataset(subset):
 
             hl1_prediction = findSubCircuitHL1(data.netlist)
+            hl1_context = EvaluationContext(data.hl1_gt, hl1_prediction, "HL1")
             hl1_results.append(
-                evaluate_graph_clustering_node_wise(
-                    prediction=hl1_prediction, ground_truth=data.hl1_gt
+                get_metric_cache().compute(
+                    "node_wise",
+                    hl1_prediction,
+                    data.hl1_gt,
+                    hl1_context.node_wise,
                 )
             )
-            hl1_cf_matries.append(create_confusion_matrix(data.hl1_gt, hl1_prediction))
+            subset_cfm["HL1"] += hl1_context.confusion_matrix()
 
             cm = findSubCircuitCM(data.netlist)
             dp = findSubCircuitDiffPair(data.netlist)
             invs = findSubCircuitInverter(data.netlist)
             hl2_prediction = cm + dp + invs
+            hl2_context = EvaluationContext(data.hl2_gt, hl2_prediction, "HL2")
             hl2_results.append(
-                evaluate_graph_clustering_node_wise(
-                    prediction=hl2_prediction, ground_truth=data.hl2_gt
+                get_metric_cache().compute(
+                    "node_wise",
+                    hl2_prediction,
+                    data.hl2_gt,
+                    hl2_context.node_wise,
                 )
             )
-
-            hl2_cf_matries.append(create_confusion_matrix(data.hl2_gt, hl2_prediction))
+            subset_cfm["HL2"] += hl2_context.confusion_matrix()
 
             hl3_prediction = findSubCircuitHL3(data.netlist)
+            hl3_context = EvaluationContext(data.hl3_gt, hl3_prediction, "HL3")
             hl3_results.append(
-                evaluate_graph_clustering_node_wise(
-                    prediction=hl3_prediction, ground_truth=data.hl3_gt
+                get_metric_cache().compute(
+                    "node_wise",
+                    hl3_prediction,
+                    data.hl3_gt,
+                    hl3_context.node_wise,
                 )
             )
-            hl3_cf_matries.append(create_confusion_matrix(data.hl3_gt, hl3_prediction))
-
-        hl1_info[subset] = average_metrics(hl1_results)
-        hl2_info[subset] = average_metrics(hl2_results)
-        hl3_info[subset] = average_metrics(hl3_results)
-        cfm[subset] = {
-            "HL1": aggregate_confusion_matrices(hl1_cf_matries),
-            "HL2": aggregate_confusion_matrices(hl2_cf_matries),
-            "HL3": aggregate_confusion_matrices(hl3_cf_matries),
+            subset_cfm["HL3"] += hl3_context.confusion_matrix()
+
+        hl1_info[subset] = {
+            **average_metrics(hl1_results),
+            **confidence_intervals(hl1_results),
+        }
+        hl2_info[subset] = {
+            **average_metrics(hl2_results),
+            **confidence_intervals(hl2_results),
+        }
+        hl3_info[subset] = {
+            **average_metrics(hl3_results),
+            **confidence_intervals(hl3_results),
         }
+        cfm[subset] = subset_cfm
     return hl1_info, hl2_info, hl3_info, cfm
 
 
@@ -610,21 +630,9 @@ def aggregate_confusion_matrices_over_subsets(cfm):
         cfm: Dictionary containing confusion matrices for each subset and hierarchical level.
 
     Returns:
-        A dictionary with aggregated confusion matrices for each hierarchical level.
+        A dictionary with the aggregated `ConfusionMatrix` of each hierarchical level.
     """
-    aggregated_cfm = {
-        "HL1": defaultdict(lambda: defaultdict(int)),
-        "HL2": defaultdict(lambda: defaultdict(int)),
-        "HL3": defaultdict(lambda: defaultdict(int)),
-    }
-
-    for subset, levels in cfm.items():
-        for level, matrix in levels.items():
-            for gt_name, pred_dict in matrix.items():
-                for pred_name, count in pred_dict.items():
-                    aggregated_cfm[level][gt_name][pred_name] += count
-
-    return aggregated_cfm
+    return merge_confusion_matrices(cfm.values())
 
 
 def code_single_eval(data: SPICENetlist):
@@ -634,7 +642,7 @@ def code_single_eval(data: SPICENetlist):
     hl3_results = []
 
     hl1_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL1(data.netlist), ground_truth=data.hl1_gt
         )
     )
@@ -644,11 +652,13 @@ def code_single_eval(data: SPICENetlist):
     invs = findSubCircuitInverter(data.netlist)
     hl2_prediction = cm + dp + invs
     hl2_results.append(
-        compute_cluster_metrics(predicted=hl2_prediction, ground_truth=data.hl2_gt)
+        cached_compute_cluster_metrics(
+            predicted=hl2_prediction, ground_truth=data.hl2_gt
+        )
     )
 
     hl3_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL3(data.netlist), ground_truth=data.hl3_gt
         )
     )
@@ -663,7 +673,7 @@ def prediction(data: SPICENetlist):
     hl3_results = []
 
     hl1_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL1(data.netlist), ground_truth=data.hl1_gt
         )
     )
@@ -673,11 +683,13 @@ def prediction(data: SPICENetlist):
     invs = findSubCircuitInverter(data.netlist)
     hl2_prediction = cm + dp + invs
     hl2_results.append(
-        compute_cluster_metrics(predicted=hl2_prediction, ground_truth=data.hl2_gt)
+        cached_compute_cluster_metrics(
+            predicted=hl2_prediction, ground_truth=data.hl2_gt
+        )
     )
 
     hl3_results.append(
-        compute_cluster_metrics(
+        cached_compute_cluster_metrics(
             predicted=findSubCircuitHL3(data.netlist), ground_truth=data.hl3_gt
         )
     )
@@ -691,6 +703,7 @@ def prediction(data: SPICENetlist):
 
 # hl1_info, hl2_info, hl3_info, cfm = code_eval()
 # aggregated_cfm = aggregate_confusion_matrices_over_subsets(cfm)
+# save_confusion_matrices("plots/confusion_matrix/cfm-v2.json", aggregated_cfm)
 
 # print("HL1 Evaluation")
 # print("==" * 20)
@@ -711,7 +724,7 @@ def prediction(data: SPICENetlist):
 #     print(f"Subset: {subset}")
 #     print("--" * 10)
 #     for level in ["HL1", "HL2", "HL3"]:
-#         for gt_name, pred_dict in cfm[subset][level].items():
+#         for gt_name, pred_dict in cfm[subset][level].to_nested().items():
 #             print(f"{gt_name}:")
 #             for pred_name, count in pred_dict.items():
 #                 print(f"  {pred_name}: {count}")
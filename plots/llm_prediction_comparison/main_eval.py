@@ -1,4 +1,5 @@
 from src.netlist import SPICENetlist
+from src.dataset import BenchmarkDataset
 import glob
 import json
 from calc1 import compute_cluster_metrics, average_metrics
@@ -30,8 +31,7 @@ import plots.method_comp.evaluation_grok as grok
 import plots.method_comp.evaluation_llama as llama
 
 
-for i in range(1, 49):
-    data = SPICENetlist(f"data/asi-fuboco-test/medium/{i}/")
+for i, data in BenchmarkDataset("medium", indices=range(1, 49)):
 
     print(f"================================={i=}==============================")
 
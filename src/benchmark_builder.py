@@ -0,0 +1,369 @@
+import os
+import glob
+import errno
+import random
+import shutil
+import click
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from src.manifest import Manifest, get_result_files
+
+allowed_subcircuit_names = {
+    "MosfetCascodeCurrentMirror",
+    "MosfetFoldedCascodeDifferentialPair",
+    "MosfetFourTransistorCurrentMirror",
+    "MosfetSimpleCurrentMirror",
+    "CapacitorArray",
+    "MosfetCascodeNMOSAnalogInverterOneDiodeTransistor",
+    "MosfetImprovedWilsonCurrentMirror",
+    "MosfetDifferentialPair",
+    "MosfetCascodedPMOSAnalogInverter",
+    "MosfetCascodedNMOSAnalogInverter",
+    "MosfetAnalogInverter",
+    "MosfetDiodeArray",
+    "MosfetCascodeAnalogInverterPmosDiodeTransistor",
+    "MosfetWilsonCurrentMirror",
+    "MosfetWideSwingCascodeCurrentMirror",
+    "MosfetNormalArray",
+    "MosfetCascodedDifferentialPair",
+    "MosfetCascodeAnalogInverterNmosCurrentMirrorLoad",
+    "MosfetCascodePMOSAnalogInverterOneDiodeTransistor",
+    "MosfetCascodeAnalogInverterNmosDiodeTransistor",
+    "MosfetCascodedAnalogInverter",
+    "MosfetNmosDiodeAnalogInverter",
+    "MosfetPmosDiodeAnalogInverter",
+    # "MosfetCascodeAnalogInverterPmosCurrentMirrorLoad",
+    # "MosfetCascodeNMOSAnalogInverterCurrentMirrorLoad",
+    # "MosfetCascodeAnalogInverterTwoCurrentMirrorLoads",
+    # "MosfetCascodeAnalogInverterNmosDiodeTransistorPmosCurrentMirrorLoad",
+}
+
+# benchmark subset -> [min, max) number of transistors
+size_buckets = {"small": (0, 20), "medium": (20, 30), "large": (30, 40)}
+
+DEFAULT_NETLIST_DIR = "/mnt/home/pham/code/outputs_0/outputs/opamps-080225"
+DEFAULT_THREE_STAGE_DIR = "/mnt/home/pham/code/maga/outputs/TopologyGen"
+
+
+def get_candidate_config(
+    netlist_dir=DEFAULT_NETLIST_DIR, three_stage_dir=DEFAULT_THREE_STAGE_DIR
+):
+    """opamp set -> [max netlists per size bucket, glob pattern of the candidates]"""
+    return {
+        "max_single_output_one_stage_opamps": [
+            50,
+            f"{netlist_dir}/SingleOutputOpAmps/one_stage_single_output_op_amp*.ckt",
+        ],
+        "max_single_output_two_stage_opamps": [
+            50,
+            f"{netlist_dir}/SingleOutputOpAmps/two_stage_single_output_op_amp*.ckt",
+        ],
+        "max_single_output_symmetrical_op_amps": [
+            50,
+            f"{netlist_dir}/SingleOutputOpAmps/symmetrical_op_amp*.ckt",
+        ],
+        "max_fully_differential_one_stage_opamps": [
+            50,
+            f"{netlist_dir}/FullyDifferentialOpAmps/one_stage_fully_differential_*.ckt",
+        ],
+        "max_fully_differential_two_stage_opamps": [
+            50,
+            f"{netlist_dir}/FullyDifferentialOpAmps/two_stage_fully_differential_*.ckt",
+        ],
+        "max_single_output_three_stage_opamps": [
+            50,
+            f"{three_stage_dir}/SingleOutputOpAmps/three_stage*.ckt",
+        ],
+    }
+
+
+def classify_candidates(config, manifest, exclude=None, num_workers=None):
+    """
+    Assign candidates to the size buckets in a single traversal.
+
+    Every candidate is indexed once by the manifest (in a process pool); each opamp set
+    then contributes at most `max` netlists with only allowed subcircuit types per bucket.
+
+    Returns:
+        Dictionary bucket name -> list of `.ckt` paths.
+    """
+    candidates = {
+        opamp_set: glob.glob(pattern) for opamp_set, (_, pattern) in config.items()
+    }
+    manifest.update(
+        [f for files in candidates.values() for f in files], num_workers=num_workers
+    )
+
+    exclude = exclude or {}
+    rows = {
+        row["path"]: row
+        for row in manifest.select(allowed_subcircuits=allowed_subcircuit_names)
+    }
+    benchmarks = {size: [] for size in size_buckets}
+    for opamp_set, (max_netlists, _) in config.items():
+        opamp_count = defaultdict(int)
+        for f in candidates[opamp_set]:
+            row = rows.get(f)
+            if row is None:
+                continue
+            for size, (min_transistors, max_transistors) in size_buckets.items():
+                if (
+                    min_transistors <= row["num_transistors"] < max_transistors
+                    and opamp_count[size] < max_netlists
+                    and f not in exclude.get(size, ())
+                ):
+                    benchmarks[size].append(f)
+                    opamp_count[size] += 1
+    return benchmarks
+
+
+def reflink(src, dst):
+    """Copy-on-write clone of `src` (Linux FICLONE); raises OSError when unsupported."""
+    import fcntl
+
+    FICLONE = 0x40049409
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+
+def link_or_copy(src, dst, link_mode="auto"):
+    """
+    Materialize `src` at `dst` as cheaply as the filesystem allows.
+
+    Args:
+        link_mode: "reflink", "hardlink", "copy", or "auto" (reflink, then hardlink, then copy).
+
+    Returns:
+        The method that was used.
+    """
+    methods = ["reflink", "hardlink", "copy"] if link_mode == "auto" else [link_mode]
+    for method in methods:
+        try:
+            if method == "reflink":
+                reflink(src, dst)
+            elif method == "hardlink":
+                os.link(src, dst)
+            else:
+                shutil.copyfile(src, dst)
+            return method
+        except (OSError, ImportError) as e:
+            if method == methods[-1]:
+                raise
+            if isinstance(e, OSError) and e.errno not in (
+                errno.EXDEV,
+                errno.EPERM,
+                errno.EOPNOTSUPP,
+                errno.ENOTTY,
+                errno.EINVAL,
+                errno.EMLINK,
+                errno.EACCES,
+            ):
+                raise
+    raise ValueError(f"unknown link mode: {link_mode}")
+
+
+def materialize_netlist(ckt_file, netlist_dir, link_mode="auto"):
+    """Lay out one benchmark entry: the `.ckt`, `structure_result.xml` and `partitioning_result.xml`."""
+    os.makedirs(netlist_dir)
+    link_or_copy(
+        ckt_file, os.path.join(netlist_dir, os.path.basename(ckt_file)), link_mode
+    )
+
+    structrec_file, partition_file = get_result_files(ckt_file)
+    if not os.path.exists(structrec_file):
+        print(f"structural_recognition.result file {structrec_file} does not exist")
+    else:
+        link_or_copy(
+            structrec_file, os.path.join(netlist_dir, "structure_result.xml"), link_mode
+        )
+
+    if not os.path.exists(partition_file):
+        print(f"partitioning.result file {partition_file} does not exist")
+    else:
+        link_or_copy(
+            partition_file,
+            os.path.join(netlist_dir, "partitioning_result.xml"),
+            link_mode,
+        )
+
+
+def exchange_paths(a, b):
+    """Atomically swap two paths (Linux `renameat2(RENAME_EXCHANGE)`); raises OSError when unsupported."""
+    import ctypes
+
+    AT_FDCWD = -100
+    RENAME_EXCHANGE = 2
+    libc = ctypes.CDLL(None, use_errno=True)
+    if not hasattr(libc, "renameat2"):
+        raise OSError(errno.ENOSYS, "renameat2 is not available")
+    if libc.renameat2(
+        AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE
+    ):
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error), a)
+
+
+def swap_in(staging_dir, output_dir):
+    """
+    Replace `output_dir` by `staging_dir`. Readers see either the old or the new tree
+    where the paths can be exchanged atomically; elsewhere `output_dir` is missing for
+    the moment between two renames.
+    """
+    if not os.path.exists(output_dir):
+        os.rename(staging_dir, output_dir)
+        return
+    try:
+        exchange_paths(staging_dir, output_dir)
+        backup_dir = staging_dir
+    except OSError:
+        backup_dir = f"{output_dir}.old-{os.getpid()}"
+        os.rename(output_dir, backup_dir)
+        os.rename(staging_dir, output_dir)
+    shutil.rmtree(backup_dir)
+
+
+def write_lines_atomic(lines, file):
+    tmp_file = f"{file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as fw:
+        for line in lines:
+            fw.write(f"{line}\n")
+    os.replace(tmp_file, file)
+
+
+def read_netlist_list(file):
+    with open(file, "r") as fr:
+        return set(fr.read().strip().split("\n"))
+
+
+def build_benchmark(
+    output_dir="data/asi-fuboco-test",
+    netlist_dir=DEFAULT_NETLIST_DIR,
+    three_stage_dir=DEFAULT_THREE_STAGE_DIR,
+    exclude_dir=None,
+    num_per_subset=100,
+    num_workers=None,
+    link_mode="auto",
+    seed=None,
+    num_threads=16,
+):
+    """
+    Build `<output_dir>/{small,medium,large}/<i>/` plus the `{small,medium,large}.txt` lists.
+
+    The tree is assembled in a staging directory and swapped in at the end (see
+    `swap_in`), so an interrupted build never leaves a half-written benchmark behind.
+
+    Args:
+        exclude_dir: existing benchmark whose `{subset}.txt` lists must not be reused
+            (e.g. the test set when building the train set).
+        num_threads: threads materializing the files of the tree.
+    """
+    config = get_candidate_config(netlist_dir, three_stage_dir)
+    manifest = Manifest(os.path.join(netlist_dir, "manifest.sqlite"))
+
+    exclude = {}
+    if exclude_dir is not None:
+        exclude = {
+            size: read_netlist_list(os.path.join(exclude_dir, f"{size}.txt"))
+            for size in size_buckets
+        }
+
+    benchmarks = classify_candidates(config, manifest, exclude, num_workers)
+    rng = random.Random(seed)
+    for size in size_buckets:
+        logger.info(f"num {size} opamps benchmarks: {len(benchmarks[size])}")
+        rng.shuffle(benchmarks[size])
+        benchmarks[size] = benchmarks[size][:num_per_subset]
+
+    output_dir = output_dir.rstrip("/")
+    staging_dir = f"{output_dir}.staging-{os.getpid()}"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    jobs = [
+        (ckt_file, os.path.join(staging_dir, size, str(index)))
+        for size in size_buckets
+        for index, ckt_file in enumerate(benchmarks[size], start=1)
+    ]
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(lambda job: materialize_netlist(*job, link_mode), jobs))
+    for size in size_buckets:
+        os.makedirs(os.path.join(staging_dir, size), exist_ok=True)
+        write_lines_atomic(benchmarks[size], os.path.join(staging_dir, f"{size}.txt"))
+
+    swap_in(staging_dir, output_dir)
+    return benchmarks
+
+
+@click.command()
+@click.option(
+    "--output_dir",
+    default="data/asi-fuboco-test",
+    help="benchmark directory to (re)build.",
+)
+@click.option(
+    "--netlist_dir", default=DEFAULT_NETLIST_DIR, help="generated opamp corpus."
+)
+@click.option(
+    "--three_stage_dir",
+    default=DEFAULT_THREE_STAGE_DIR,
+    help="corpus of three-stage opamps.",
+)
+@click.option(
+    "--exclude_dir",
+    default=None,
+    help="benchmark whose netlists must not be reused (e.g. data/asi-fuboco-test for the train set).",
+)
+@click.option("--num_per_subset", default=100, help="netlists per size bucket.")
+@click.option(
+    "--num_workers",
+    default=None,
+    type=int,
+    help="processes used to classify candidates.",
+)
+@click.option(
+    "--link_mode",
+    default="auto",
+    type=click.Choice(["auto", "reflink", "hardlink", "copy"]),
+    help="how files are materialized in the benchmark tree.",
+)
+@click.option(
+    "--seed", default=None, type=int, help="seed of the shuffle before truncation."
+)
+@click.option(
+    "--num_threads",
+    default=16,
+    help="threads materializing the files of the benchmark tree.",
+)
+def main(
+    output_dir,
+    netlist_dir,
+    three_stage_dir,
+    exclude_dir,
+    num_per_subset,
+    num_workers,
+    link_mode,
+    seed,
+    num_threads,
+):
+    build_benchmark(
+        output_dir,
+        netlist_dir,
+        three_stage_dir,
+        exclude_dir,
+        num_per_subset,
+        num_workers,
+        link_mode,
+        seed,
+        num_threads,
+    )
+
+
+if __name__ == "__main__":
+    main()
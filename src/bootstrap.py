@@ -0,0 +1,137 @@
+import itertools
+
+import numpy as np
+
+from calc1 import METRIC_KEYS
+
+# upper bound on the entries of one block of resampling weights (~32 MB of int64)
+MAX_BLOCK_ENTRIES = 1 << 22
+
+
+def metric_array(metrics_list, keys=METRIC_KEYS) -> np.ndarray:
+    """Per-netlist metric dicts as a `(num_netlists, len(keys))` float array."""
+    return np.array(
+        [[metrics[key] for key in keys] for metrics in metrics_list], dtype=np.float64
+    ).reshape(len(metrics_list), len(keys))
+
+
+def bootstrap_means(
+    values: np.ndarray, num_resamples: int = 10000, seed: int = 0
+) -> np.ndarray:
+    """
+    Means of `num_resamples` bootstrap resamples of the rows of `values`.
+
+    Each resample is drawn as a row of multinomial counts (how often every netlist is
+    picked), so all resample means of all columns are one matrix product
+    `counts @ values / n` instead of a Python loop over resamples. The same `seed`
+    gives the same resamples for every input with the same number of rows, which
+    makes intervals of different models paired.
+
+    Returns:
+        Array of shape `(num_resamples, *values.shape[1:])`.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    flat = values.reshape(n, int(np.prod(values.shape[1:])))
+    means = np.zeros((num_resamples, flat.shape[1]))
+    if n == 0:
+        return means.reshape(num_resamples, *values.shape[1:])
+
+    rng = np.random.default_rng(seed)
+    probabilities = np.full(n, 1.0 / n)
+    block = max(1, MAX_BLOCK_ENTRIES // n)
+    for start in range(0, num_resamples, block):
+        stop = min(start + block, num_resamples)
+        counts = rng.multinomial(n, probabilities, size=stop - start)
+        means[start:stop] = counts @ flat / n
+    return means.reshape(num_resamples, *values.shape[1:])
+
+
+def percentile_interval(samples: np.ndarray, confidence: float = 0.95) -> np.ndarray:
+    """`(2, ...)` array with the lower and upper percentile bounds over axis 0."""
+    alpha = (1 - confidence) / 2
+    return np.quantile(samples, [alpha, 1 - alpha], axis=0)
+
+
+def confidence_intervals(
+    metrics_list,
+    keys=METRIC_KEYS,
+    confidence: float = 0.95,
+    num_resamples: int = 10000,
+    seed: int = 0,
+) -> dict:
+    """
+    Bootstrap confidence intervals of the mean of every metric over netlists, to be
+    reported next to `average_metrics`.
+
+    Returns:
+        `{"<key> CI": [lower, upper]}` for every metric key.
+    """
+    samples = bootstrap_means(metric_array(metrics_list, keys), num_resamples, seed)
+    lower, upper = percentile_interval(samples, confidence)
+    return {
+        f"{key} CI": [float(lower[i]), float(upper[i])] for i, key in enumerate(keys)
+    }
+
+
+def paired_comparisons(
+    runs: dict,
+    key: str = "F1-score",
+    confidence: float = 0.95,
+    num_resamples: int = 10000,
+    seed: int = 0,
+) -> list[dict]:
+    """
+    Paired bootstrap of the mean difference of `key` between every two runs.
+
+    Args:
+        runs: `{name: per-netlist metric dicts}`, all evaluated on the same netlists
+            in the same order (e.g. the `find_subcircuits` results of several models).
+
+    Returns:
+        One dict per pair `(a, b)` with the mean difference `a - b`, its confidence
+        interval and a two-sided bootstrap p-value for "no difference".
+    """
+    names = list(runs)
+    if not names:
+        return []
+    lengths = {len(runs[name]) for name in names}
+    if len(lengths) > 1:
+        raise ValueError(f"runs cover different numbers of netlists: {lengths}")
+
+    # one column per run; the same resample counts are applied to every column, so
+    # column differences of the resample means are resample means of the differences
+    values = np.concatenate([metric_array(runs[name], [key]) for name in names], axis=1)
+    samples = bootstrap_means(values, num_resamples, seed)
+    means = values.mean(axis=0) if len(values) else np.zeros(len(names))
+
+    comparisons = []
+    for i, j in itertools.combinations(range(len(names)), 2):
+        differences = samples[:, i] - samples[:, j]
+        lower, upper = percentile_interval(differences, confidence)
+        p_value = 2 * min(np.mean(differences <= 0), np.mean(differences >= 0))
+        comparisons.append(
+            {
+                "A": names[i],
+                "B": names[j],
+                "Metric": key,
+                "Difference": float(means[i] - means[j]),
+                "CI": [float(lower), float(upper)],
+                "p-value": float(min(p_value, 1.0)),
+            }
+        )
+    return comparisons
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    model_a = [
+        {"Precision": p, "Recall": r, "F1-score": 2 * p * r / (p + r)}
+        for p, r in rng.uniform(0.4, 1.0, size=(100, 2))
+    ]
+    model_b = [
+        {k: max(v - rng.uniform(0, 0.1), 0) for k, v in metrics.items()}
+        for metrics in model_a
+    ]
+    print(confidence_intervals(model_a))
+    print(paired_comparisons({"a": model_a, "b": model_b}))
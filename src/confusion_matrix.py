@@ -0,0 +1,175 @@
+import os
+import json
+
+import numpy as np
+
+from src.netlist import hierarchical_level_labels
+
+# row/column collecting subcircuit names outside the registry (e.g. hallucinated by an LLM)
+OTHER_LABEL = "other"
+
+
+class ConfusionMatrix:
+    """
+    Transistor-overlap confusion matrix of one hierarchical level, backed by an integer
+    array over the registered labels `hierarchical_level_labels[level] + ["other"]`.
+
+    `counts[i, j]` is the number of transistors shared by ground-truth clusters named
+    `labels[i]` and predicted clusters named `labels[j]` (same numbers as
+    `create_confusion_matrix`). Because every matrix of a level has the same shape,
+    merging netlists, subsets or shards is a single array addition.
+
+    Example:
+        total = ConfusionMatrix("HL2")
+        for i, data in BenchmarkDataset("small"):
+            total += ConfusionMatrix.from_clusters("HL2", data.hl2_gt, prediction)
+        save_confusion_matrices("cfm.json", {"HL2": total})
+    """
+
+    def __init__(self, level: str, counts: np.ndarray = None):
+        self.level = level
+        self.labels = hierarchical_level_labels[level] + [OTHER_LABEL]
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        if counts is None:
+            counts = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    def label_id(self, name: str) -> int:
+        return self.index.get(name, self.index[OTHER_LABEL])
+
+    def _label_entries(self, clusters, transistor_index):
+        """(transistor, label) coordinates, one per distinct member of every cluster."""
+        rows = []
+        columns = []
+        for name, components in clusters:
+            for t in set(components):
+                rows.append(transistor_index.setdefault(t, len(transistor_index)))
+                columns.append(self.label_id(name))
+        return rows, columns
+
+    @classmethod
+    def from_clusters(cls, level: str, ground_truth, prediction) -> "ConfusionMatrix":
+        matrix = cls(level)
+        transistor_index = {}
+        gt_rows, gt_columns = matrix._label_entries(ground_truth, transistor_index)
+        pred_rows, pred_columns = matrix._label_entries(prediction, transistor_index)
+
+        shape = (len(transistor_index), len(matrix.labels))
+        gt_counts = np.zeros(shape, dtype=np.int64)
+        pred_counts = np.zeros(shape, dtype=np.int64)
+        np.add.at(gt_counts, (gt_rows, gt_columns), 1)
+        np.add.at(pred_counts, (pred_rows, pred_columns), 1)
+        # sum over cluster pairs of |gt & pred| == sum over transistors of the products
+        matrix.counts += gt_counts.T @ pred_counts
+        return matrix
+
+    @classmethod
+    def from_overlap(
+        cls, level: str, gt_names, pred_names, overlap_matrix
+    ) -> "ConfusionMatrix":
+        """
+        Same counts as `from_clusters`, from an already computed cluster overlap matrix
+        (`overlap[i, j] = |gt_i & pred_j|`): only the cluster names are mapped to labels.
+        """
+        matrix = cls(level)
+        gt_ids = np.array([matrix.label_id(name) for name in gt_names], dtype=np.int64)
+        pred_ids = np.array(
+            [matrix.label_id(name) for name in pred_names], dtype=np.int64
+        )
+        np.add.at(
+            matrix.counts,
+            (gt_ids[:, None], pred_ids[None, :]),
+            np.asarray(overlap_matrix).astype(np.int64),
+        )
+        return matrix
+
+    @classmethod
+    def from_nested(cls, level: str, nested: dict) -> "ConfusionMatrix":
+        """Convert the `{gt_name: {pred_name: count}}` dictionaries of `create_confusion_matrix`."""
+        matrix = cls(level)
+        for gt_name, pred_dict in nested.items():
+            for pred_name, count in pred_dict.items():
+                matrix.counts[
+                    matrix.label_id(gt_name), matrix.label_id(pred_name)
+                ] += count
+        return matrix
+
+    def to_nested(self) -> dict:
+        """Non-zero counts as `{gt_name: {pred_name: count}}`."""
+        nested = {}
+        for i, j in zip(*np.nonzero(self.counts)):
+            nested.setdefault(self.labels[i], {})[self.labels[j]] = int(
+                self.counts[i, j]
+            )
+        return nested
+
+    def as_array(self, labels: list[str] = None) -> np.ndarray:
+        """Counts restricted to / reordered by `labels` (e.g. the order used in a plot)."""
+        if labels is None:
+            return self.counts.copy()
+        ids = [self.index[label] for label in labels]
+        return self.counts[np.ix_(ids, ids)]
+
+    def merge(self, other: "ConfusionMatrix") -> "ConfusionMatrix":
+        if other.level != self.level:
+            raise ValueError(f"cannot merge {other.level} into {self.level}")
+        self.counts += other.counts
+        return self
+
+    def __iadd__(self, other: "ConfusionMatrix") -> "ConfusionMatrix":
+        return self.merge(other)
+
+    def __add__(self, other: "ConfusionMatrix") -> "ConfusionMatrix":
+        return ConfusionMatrix(self.level, self.counts.copy()).merge(other)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, ConfusionMatrix)
+            and self.level == other.level
+            and np.array_equal(self.counts, other.counts)
+        )
+
+    def to_dict(self) -> dict:
+        return {"labels": self.labels, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, level: str, state: dict) -> "ConfusionMatrix":
+        matrix = cls(level)
+        if state["labels"] != matrix.labels:
+            # written with another registry: map by name
+            for i, gt_name in enumerate(state["labels"]):
+                for j, pred_name in enumerate(state["labels"]):
+                    matrix.counts[
+                        matrix.label_id(gt_name), matrix.label_id(pred_name)
+                    ] += state["counts"][i][j]
+            return matrix
+        matrix.counts[:] = state["counts"]
+        return matrix
+
+
+def merge_confusion_matrices(matrices: list[dict]) -> dict:
+    """Sum `{level: ConfusionMatrix}` dictionaries, e.g. over subsets or shards."""
+    merged = {}
+    for levels in matrices:
+        for level, matrix in levels.items():
+            if level in merged:
+                merged[level].merge(matrix)
+            else:
+                merged[level] = ConfusionMatrix(level, matrix.counts.copy())
+    return merged
+
+
+def save_confusion_matrices(path: str, matrices: dict):
+    """Write `{level: ConfusionMatrix}` as one small JSON file (atomically)."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fw:
+        json.dump({level: m.to_dict() for level, m in matrices.items()}, fw)
+    os.replace(tmp_path, path)
+
+
+def load_confusion_matrices(path: str) -> dict:
+    with open(path, "r") as fr:
+        state = json.load(fr)
+    return {level: ConfusionMatrix.from_dict(level, s) for level, s in state.items()}
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+
+from src.netlist import SPICENetlist
+from src.zip_dataset import listdir
+
+
+def parse_index_range(spec) -> list[int]:
+    """
+    Parse netlist indices such as "1-50", "1-10,42,90-100" (inclusive) or an iterable of ints.
+    """
+    if spec is None:
+        return None
+    if not isinstance(spec, str):
+        return [int(i) for i in spec]
+    indices = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            indices += list(range(int(start), int(end) + 1))
+        else:
+            indices.append(int(part))
+    return indices
+
+
+def parse_shard(spec) -> tuple[int, int]:
+    """Parse a shard as "i/n" (0-based `i`) or a tuple `(i, n)`."""
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        shard_id, num_shards = (int(x) for x in spec.split("/"))
+    else:
+        shard_id, num_shards = (int(x) for x in spec)
+    if not 0 <= shard_id < num_shards:
+        raise ValueError(f"invalid shard {spec}: expected 0 <= i < n")
+    return shard_id, num_shards
+
+
+class BenchmarkDataset:
+    """
+    The netlists of one benchmark subset, e.g. `data/asi-fuboco-test/small/{i}/`.
+
+    Entries are discovered from the subset directory (or its zip archive) instead of
+    assuming `1..100`, can be restricted to an index range and split round-robin into
+    shards, and are parsed on a background thread while the caller is busy with the
+    previous netlist (e.g. waiting on an LLM call).
+
+    Example:
+        for i, data in BenchmarkDataset("small", indices="1-50", shard="0/2"):
+            ...
+    """
+
+    def __init__(
+        self,
+        subset: str = "small",
+        data_dir: str = "data/asi-fuboco-test",
+        indices=None,
+        shard=None,
+        prefetch: int = 2,
+        use_cache: bool = True,
+    ):
+        self.subset = subset
+        self.data_dir = data_dir
+        self.prefetch = prefetch
+        self.use_cache = use_cache
+
+        available = sorted(
+            int(name)
+            for name in listdir(os.path.join(data_dir, subset))
+            if name.isdigit()
+        )
+        indices = parse_index_range(indices)
+        if indices is not None:
+            wanted = set(indices)
+            missing = wanted - set(available)
+            if missing:
+                raise ValueError(
+                    f"netlists {sorted(missing)} do not exist in {data_dir}/{subset}"
+                )
+            available = [i for i in available if i in wanted]
+
+        shard = parse_shard(shard)
+        if shard is not None:
+            shard_id, num_shards = shard
+            available = available[shard_id::num_shards]
+        self.indices = available
+
+    def netlist_path(self, i: int) -> str:
+        return f"{self.data_dir}/{self.subset}/{i}/"
+
+    def load(self, i: int) -> SPICENetlist:
+        return SPICENetlist(self.netlist_path(i), use_cache=self.use_cache)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position: int):
+        i = self.indices[position]
+        return i, self.load(i)
+
+    def __iter__(self):
+        """Yield `(i, SPICENetlist)` in index order."""
+        if self.prefetch <= 0:
+            for i in self.indices:
+                yield i, self.load(i)
+            return
+
+        loaded = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def producer():
+            for i in self.indices:
+                try:
+                    item = (i, self.load(i), None)
+                except Exception as e:
+                    item = (i, None, e)
+                # block until the consumer catches up, but give up once it is gone
+                while not stop.is_set():
+                    try:
+                        loaded.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+
+        thread = threading.Thread(target=producer, daemon=True)
+        thread.start()
+        try:
+            for _ in self.indices:
+                i, data, error = loaded.get()
+                if error is not None:
+                    raise error
+                yield i, data
+        finally:
+            stop.set()
+            thread.join()
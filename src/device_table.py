@@ -0,0 +1,123 @@
+import numpy as np
+
+# integer codes of the `types` column
+DEVICE_TYPES = ("nmos", "pmos", "capacitor", "other")
+NMOS, PMOS, CAPACITOR, OTHER = range(len(DEVICE_TYPES))
+
+# columns of the `terminals` array; capacitors only use the first two
+TERMINALS = ("drain", "gate", "source", "bulk")
+
+
+class DeviceTable:
+    """
+    Columnar view of a (masked) flat SPICE netlist, parsed once.
+
+    Every component line becomes one row:
+        - `names[i]`: instance name (e.g. "m3", "c1"), `index[name] -> i`
+        - `types[i]`: device type code, see `DEVICE_TYPES`
+        - `terminals[i]`: interned net IDs of drain/gate/source/bulk for transistors
+          and of both plates for capacitors, padded with -1
+    Net names are interned in order of first appearance: `nets[net_id]`, `net_index[net] -> net_id`.
+
+    Example:
+        m1 a ibias ground ground nmos  ->  names=["m1"], types=[NMOS], terminals=[[0, 1, 2, 2]]
+    """
+
+    def __init__(self, netlist: str):
+        self.names = []
+        self.index = {}
+        self.nets = []
+        self.net_index = {}
+
+        types = []
+        terminals = []
+        for line in netlist.splitlines():
+            tokens = line.split()
+            if not tokens or tokens[0].startswith("."):
+                continue
+            name = tokens[0]
+            if name.startswith("m") and len(tokens) >= 6:
+                device_type = tokens[5].lower()
+                if device_type in ("nmos", "pmos"):
+                    types.append(DEVICE_TYPES.index(device_type))
+                else:
+                    types.append(OTHER)
+                nodes = tokens[1:5]
+            elif name.startswith("c") and len(tokens) >= 3:
+                types.append(CAPACITOR)
+                nodes = tokens[1:3]
+            else:
+                types.append(OTHER)
+                nodes = tokens[1:5]
+
+            row = [self.intern(net) for net in nodes]
+            terminals.append(row + [-1] * (len(TERMINALS) - len(row)))
+            self.index[name] = len(self.names)
+            self.names.append(name)
+
+        self.types = np.asarray(types, dtype=np.int8)
+        self.terminals = np.asarray(terminals, dtype=np.int32).reshape(
+            -1, len(TERMINALS)
+        )
+
+    @classmethod
+    def from_arrays(cls, names, nets, types, terminals) -> "DeviceTable":
+        """Rebuild a table from its columns without re-parsing (the arrays are not copied)."""
+        table = cls.__new__(cls)
+        table.names = list(names)
+        table.index = {name: i for i, name in enumerate(table.names)}
+        table.nets = list(nets)
+        table.net_index = {net: i for i, net in enumerate(table.nets)}
+        table.types = types
+        table.terminals = terminals
+        return table
+
+    def intern(self, net: str) -> int:
+        net_id = self.net_index.get(net)
+        if net_id is None:
+            net_id = len(self.nets)
+            self.net_index[net] = net_id
+            self.nets.append(net)
+        return net_id
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def drain(self) -> np.ndarray:
+        return self.terminals[:, 0]
+
+    @property
+    def gate(self) -> np.ndarray:
+        return self.terminals[:, 1]
+
+    @property
+    def source(self) -> np.ndarray:
+        return self.terminals[:, 2]
+
+    @property
+    def bulk(self) -> np.ndarray:
+        return self.terminals[:, 3]
+
+    @property
+    def is_transistor(self) -> np.ndarray:
+        return (self.types == NMOS) | (self.types == PMOS)
+
+    @property
+    def num_transistors(self) -> int:
+        return int(np.count_nonzero(self.is_transistor))
+
+    def net_id(self, net: str) -> int:
+        """Interned ID of `net`, or -1 if the netlist does not use it."""
+        return self.net_index.get(net, -1)
+
+    def devices_on(self, net: str, terminal: str = None) -> list[str]:
+        """Names of the devices connected to `net` (optionally only through `terminal`)."""
+        net_id = self.net_id(net)
+        if net_id < 0:
+            return []
+        if terminal is None:
+            mask = (self.terminals == net_id).any(axis=1)
+        else:
+            mask = self.terminals[:, TERMINALS.index(terminal)] == net_id
+        return [self.names[i] for i in np.flatnonzero(mask)]
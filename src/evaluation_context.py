@@ -0,0 +1,150 @@
+from functools import cached_property
+
+import numpy as np
+
+from calc1 import GroundTruthIndex, compute_cluster_counts, metrics_from_counts
+from examples.measure_fn2 import (
+    get_transistor_index,
+    multilabel_scores,
+    score_cluster_matching,
+    clustering_report,
+    confusion_from_overlap,
+    trace_node_labels,
+    trace_nodes,
+)
+from src import tracing
+from src.confusion_matrix import ConfusionMatrix
+
+
+class EvaluationContext:
+    """
+    One (ground truth, prediction) pair of a netlist with everything the metrics derive
+    from it, each built at most once and shared by every metric:
+
+        - `gt_index`: lower-cased `GroundTruthIndex` (`cluster_metrics`)
+        - `transistor_index`, `gt_incidence`, `pred_incidence`: dense cluster x
+          transistor incidences; their product `overlap` feeds the Hungarian matching
+          and both confusion matrix formats
+        - `indicator_matrices`, `multilabel`: transistor x class indicators derived
+          from the incidences, and their macro/micro/node-wise scores
+
+    Results are identical to calling `compute_cluster_metrics`,
+    `evaluate_graph_clustering_node_wise`, `evaluate_graph_clustering_class_wise`,
+    `create_confusion_matrix` and `ConfusionMatrix.from_clusters` separately.
+
+    Example:
+        context = EvaluationContext(data.hl2_gt, prediction, level="HL2")
+        report = context.evaluate(["cluster", "node_wise", "class_wise", "confusion"])
+    """
+
+    def __init__(self, ground_truth, prediction, level: str = None):
+        self.ground_truth = list(ground_truth)
+        self.prediction = list(prediction)
+        self.level = level
+
+    @cached_property
+    def gt_index(self) -> GroundTruthIndex:
+        return GroundTruthIndex(self.ground_truth)
+
+    @cached_property
+    def cluster_counts(self) -> tuple[int, int, int]:
+        return compute_cluster_counts(self.prediction, self.ground_truth, self.gt_index)
+
+    @cached_property
+    def transistor_index(self) -> dict:
+        return get_transistor_index(self.ground_truth, self.prediction)
+
+    def _incidence(self, clusters) -> np.ndarray:
+        # dense: netlists have tens of transistors, where scipy.sparse overhead dominates
+        incidence = np.zeros((len(clusters), len(self.transistor_index)))
+        for i, (_, components) in enumerate(clusters):
+            incidence[i, [self.transistor_index[t] for t in components]] = 1
+        return incidence
+
+    @cached_property
+    def gt_incidence(self) -> np.ndarray:
+        return self._incidence(self.ground_truth)
+
+    @cached_property
+    def pred_incidence(self) -> np.ndarray:
+        return self._incidence(self.prediction)
+
+    @cached_property
+    def overlap(self) -> np.ndarray:
+        """`overlap[i, j] = |gt_i & pred_j|`, as `cluster_overlap_matrix`."""
+        return self.gt_incidence @ self.pred_incidence.T
+
+    @cached_property
+    def classes(self) -> list[str]:
+        return sorted({name for name, _ in self.ground_truth + self.prediction})
+
+    def _class_indicator(self, clusters, incidence) -> np.ndarray:
+        class_id = {name: j for j, name in enumerate(self.classes)}
+        cluster_classes = np.zeros((len(clusters), len(self.classes)))
+        cluster_classes[
+            np.arange(len(clusters)), [class_id[n] for n, _ in clusters]
+        ] = 1
+        return incidence.T @ cluster_classes > 0
+
+    @cached_property
+    def indicator_matrices(self) -> tuple[np.ndarray, np.ndarray]:
+        """`(y_true, y_pred)` of `build_indicator_matrices`, from the incidences."""
+        return (
+            self._class_indicator(self.ground_truth, self.gt_incidence),
+            self._class_indicator(self.prediction, self.pred_incidence),
+        )
+
+    @cached_property
+    def multilabel(self) -> dict:
+        return multilabel_scores(*self.indicator_matrices)
+
+    @cached_property
+    def cluster_matching(self) -> dict:
+        return score_cluster_matching(self.overlap, self.ground_truth, self.prediction)
+
+    def cluster_metrics(self) -> dict:
+        """`compute_cluster_metrics(prediction, ground_truth)`."""
+        return metrics_from_counts(*self.cluster_counts)
+
+    def node_wise(self) -> dict:
+        """`evaluate_graph_clustering_node_wise(ground_truth, prediction)`."""
+        if tracing.enabled:
+            trace_nodes(
+                list(self.transistor_index), self.classes, *self.indicator_matrices
+            )
+        return clustering_report(self.multilabel, "node", self.cluster_matching)
+
+    def class_wise(self) -> dict:
+        """`evaluate_graph_clustering_class_wise(ground_truth, prediction)`."""
+        if tracing.enabled:
+            trace_node_labels(
+                list(self.transistor_index), self.classes, *self.indicator_matrices
+            )
+        return clustering_report(self.multilabel, "macro", self.cluster_matching)
+
+    def confusion_matrix(self, level: str = None) -> ConfusionMatrix:
+        """`ConfusionMatrix.from_clusters(level, ground_truth, prediction)`."""
+        return ConfusionMatrix.from_overlap(
+            level or self.level,
+            [name for name, _ in self.ground_truth],
+            [name for name, _ in self.prediction],
+            self.overlap,
+        )
+
+    def confusion_dict(self) -> dict:
+        """`create_confusion_matrix(ground_truth, prediction)`."""
+        return confusion_from_overlap(self.overlap, self.ground_truth, self.prediction)
+
+    def evaluate(self, metrics=("cluster", "node_wise", "class_wise")) -> dict:
+        """`{metric: result}` for the names of `metric_functions`."""
+        return {metric: metric_functions[metric](self) for metric in metrics}
+
+
+# metric name -> function(context); every function returns a dict of scalars except
+# `confusion`, whose matrices are summed over netlists instead
+metric_functions = {
+    "cluster": EvaluationContext.cluster_metrics,
+    "node_wise": EvaluationContext.node_wise,
+    "class_wise": EvaluationContext.class_wise,
+    "confusion": EvaluationContext.confusion_matrix,
+}
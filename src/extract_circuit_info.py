@@ -1,7 +1,7 @@
 import xml.etree.ElementTree as ET
-import glob
 import os
 from collections import defaultdict
+from src.zip_dataset import open_file, listdir
 
 inv = [
     "MosfetCascodedPMOSAnalogInverter",
@@ -44,7 +44,8 @@ def rename(circuit_name):
 
 
 def get_hl1_cluster_labels(netlist_dir="data/netlist1/"):
-    tree = ET.parse(glob.glob(os.path.join(netlist_dir, "structure_result.xml"))[0])
+    with open_file(os.path.join(netlist_dir, "structure_result.xml")) as f:
+        tree = ET.parse(f)
     root = tree.getroot()
     subcircuits = root[1]
 
@@ -55,7 +56,8 @@ def get_hl1_cluster_labels(netlist_dir="data/netlist1/"):
             for device in structure.iter("device"):
                 devices["MosfetDiode"].add(device.attrib["name"].replace("/", ""))
 
-    tree = ET.parse(glob.glob(os.path.join(netlist_dir, "partitioning_result.xml"))[0])
+    with open_file(os.path.join(netlist_dir, "partitioning_result.xml")) as f:
+        tree = ET.parse(f)
     root = tree.getroot()
     subcircuits = root[1]
     for cap in subcircuits.iter("capacitance"):
@@ -69,7 +71,8 @@ def get_hl1_cluster_labels(netlist_dir="data/netlist1/"):
 
 
 def get_hl2_cluster_labels(netlist_dir="data/netlist1/"):
-    tree = ET.parse(glob.glob(os.path.join(netlist_dir, "structure_result.xml"))[0])
+    with open_file(os.path.join(netlist_dir, "structure_result.xml")) as f:
+        tree = ET.parse(f)
     root = tree.getroot()
     subcircuits = root[1]
 
@@ -109,7 +112,8 @@ def get_hl2_cluster_labels(netlist_dir="data/netlist1/"):
 
 
 def get_hl3_cluster_labels(netlist_dir="data/asi-fuboco-test"):
-    tree = ET.parse(glob.glob(os.path.join(netlist_dir, "partitioning_result.xml"))[0])
+    with open_file(os.path.join(netlist_dir, "partitioning_result.xml")) as f:
+        tree = ET.parse(f)
     root = tree.getroot()
     partitions = root[1]
     name_mappings = {
@@ -168,6 +172,198 @@ def get_hl3_cluster_labels(netlist_dir="data/asi-fuboco-test"):
     return hl3_clusters
 
 
+# (container tag under `circuit_partitioning_results`, part tag) -> HL3 label of a part
+hl3_part_tags = {
+    "gmParts": "gmPart",
+    "loadParts": "loadPart",
+    "biasParts": "biasPart",
+    "commonModeSignalDetectorParts": "commonModeSignalDetectorPart",
+    "positiveFeedbackParts": "positiveFeedbackPart",
+}
+hl3_stage_name_mappings = {
+    "firstStage": "firstStage",
+    "primarySecondStage": "secondStage",
+    "secondarySecondStage": "secondStage",
+    "thirdStage": "secondStage",
+    "fourthStage": "thirdStage",
+}
+
+
+def _iterparse(source):
+    """
+    Stream `source` with `iterparse`, yielding `(event, elem, positions)` where
+    `positions[d]` is the index of the open element at depth `d` among its siblings,
+    so `positions[:2] == [0, 1]` means "inside `root[1]`".
+
+    Elements are cleared once they are closed, and the results container is emptied
+    after each of its children, so memory stays bounded by one top-level subcircuit.
+    """
+    positions = []
+    num_children = [0]
+    stack = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            positions.append(num_children[-1])
+            num_children[-1] += 1
+            num_children.append(0)
+            stack.append(elem)
+            yield event, elem, positions
+        else:
+            yield event, elem, positions
+            positions.pop()
+            num_children.pop()
+            stack.pop()
+            elem.clear()
+            if len(stack) == 2:
+                stack[-1].clear()
+
+
+def _parse_structure_result(source):
+    """HL1 diode-connected transistors and HL2 subcircuits from `structure_result.xml`."""
+    diodes = {}
+    structures = []
+    diode_depth = 0
+    sc = None
+    for event, elem, positions in _iterparse(source):
+        depth = len(positions) - 1
+        in_results = depth >= 1 and positions[1] == 1
+        if event == "start":
+            if elem.tag == "structure" and elem.attrib["name"].startswith(
+                "MosfetDiodeArray"
+            ):
+                diode_depth += 1
+            if in_results and depth == 2:
+                sc = {"name": elem.attrib["name"], "devices": [], "vref": False}
+            elif in_results and depth == 4 and positions[3] == 0:
+                if elem.attrib.get("net") == "/vref":
+                    sc["vref"] = True
+            if elem.tag == "device":
+                name = elem.attrib["name"].replace("/", "")
+                if diode_depth > 0:
+                    diodes[name] = None
+                if sc is not None:
+                    sc["devices"].append(name)
+            continue
+
+        if elem.tag == "structure" and elem.attrib["name"].startswith(
+            "MosfetDiodeArray"
+        ):
+            diode_depth -= 1
+        if not (in_results and depth == 2):
+            continue
+
+        # same filtering as `get_hl2_cluster_labels`
+        if sc["name"].startswith(
+            (
+                "MosfetNmosDiodeAnalogInverter",
+                "MosfetPmosDiodeAnalogInverter",
+                "CapacitorArray",
+                "MosfetNormalArray",
+                "MosfetDiodeArray",
+            )
+        ):
+            sc = None
+            continue
+        name = rename(sc["name"])
+        if name == "DiffPair" and sc["vref"]:
+            sc = None
+            continue
+        if name not in ["cap", "MosfetDiode", "Mosfet"]:
+            if len(sc["devices"]) == 1:
+                print("Warning: Only one device in subcircuit:", name)
+                print(sc["name"])
+            structures.append((name, sc["devices"]))
+        sc = None
+
+    return diodes, structures
+
+
+def _parse_partitioning_result(source):
+    """HL1 capacitors and HL3 partitions from `partitioning_result.xml`."""
+    caps = {}
+    hl3_clusters = {}
+    # (depth, label) of the capacitances / parts the parser is currently inside
+    active_caps = []
+    active_parts = []
+    container = None
+    for event, elem, positions in _iterparse(source):
+        depth = len(positions) - 1
+        in_results = depth >= 1 and positions[1] == 1
+        if not in_results:
+            continue
+
+        if event == "end":
+            if active_caps and active_caps[-1][0] == depth:
+                active_caps.pop()
+            if active_parts and active_parts[-1][0] == depth:
+                active_parts.pop()
+            if depth == 2:
+                container = None
+            continue
+
+        if depth == 2:
+            container = elem.tag
+        if elem.tag == "capacitance":
+            active_caps.append((depth, elem.attrib["type"] + "_cap"))
+        elif depth > 2 and elem.tag == hl3_part_tags.get(container):
+            if elem.tag == "gmPart":
+                label = hl3_stage_name_mappings.get(
+                    elem.attrib["type"], elem.attrib["type"]
+                )
+            else:
+                label = elem.tag
+            active_parts.append((depth, label))
+        elif elem.tag == "device":
+            name = elem.attrib["name"].replace("/", "")
+            for _, label in active_caps:
+                caps.setdefault(label, {})[name] = None
+            for _, label in active_parts:
+                hl3_clusters.setdefault(label, {})[name] = None
+
+    return caps, hl3_clusters
+
+
+def get_all_cluster_labels(netlist_dir="data/asi-fuboco-test/small/1/"):
+    """
+    Single-pass replacement for calling `get_hl1_cluster_labels`, `get_hl2_cluster_labels`
+    and `get_hl3_cluster_labels` on the same netlist: `structure_result.xml` and
+    `partitioning_result.xml` are each streamed exactly once.
+
+    Returns:
+        Tuple `(hl1_clusters, hl2_clusters, hl3_clusters)`, each a list of
+        `(subcircuit_name, [component names])` as returned by the individual functions.
+    """
+    with open_file(os.path.join(netlist_dir, "structure_result.xml"), "rb") as f:
+        diodes, hl2_clusters = _parse_structure_result(f)
+    with open_file(os.path.join(netlist_dir, "partitioning_result.xml"), "rb") as f:
+        caps, hl3_clusters = _parse_partitioning_result(f)
+
+    hl1_clusters = [("MosfetDiode", list(diodes))] if diodes else []
+    hl1_clusters += [(k, list(v)) for k, v in caps.items()]
+    hl3_clusters = [(k, list(v)) for k, v in hl3_clusters.items()]
+    return hl1_clusters, hl2_clusters, hl3_clusters
+
+
+def get_subset_cluster_labels(subset_dir="data/asi-fuboco-test/small", num_workers=1):
+    """
+    Bulk mode of `get_all_cluster_labels` for every netlist directory in `subset_dir`.
+
+    Returns:
+        Dictionary mapping each netlist directory (in numeric order) to its
+        `(hl1_clusters, hl2_clusters, hl3_clusters)`.
+    """
+    entries = sorted((name for name in listdir(subset_dir) if name.isdigit()), key=int)
+    netlist_dirs = [os.path.join(subset_dir, name, "") for name in entries]
+    if num_workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            labels = list(executor.map(get_all_cluster_labels, netlist_dirs))
+    else:
+        labels = [get_all_cluster_labels(d) for d in netlist_dirs]
+    return dict(zip(netlist_dirs, labels))
+
+
 if __name__ == "__main__":
     print(get_hl2_cluster_labels(netlist_dir="data/asi-fuboco-test/small/2/"))
     print(get_hl3_cluster_labels(netlist_dir="data/asi-fuboco-test/small/1/"))
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+# model attributes that change what a model answers, part of every cache key
+GENERATION_PARAMS = (
+    "temperature",
+    "max_tokens",
+    "num_predict",
+    "top_p",
+    "top_k",
+    "seed",
+    "stop",
+    "reasoning_effort",
+)
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode for a request that is not in the cache."""
+
+
+def get_generation_params(model) -> dict:
+    # wrappers (`CachedChatModel`, `RateLimitedChatModel`) report the wrapped model's
+    if hasattr(model, "generation_params"):
+        return model.generation_params
+    return {
+        name: getattr(model, name)
+        for name in GENERATION_PARAMS
+        if getattr(model, name, None) is not None
+    }
+
+
+def render_prompt(prompt) -> str:
+    """Exact text sent to the model (`ChatPromptValue.to_string()` includes the roles)."""
+    return prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+
+
+def get_request_key(
+    provider: str, model_name: str, params: dict, prompt: str, occurrence: int = 0
+) -> str:
+    """
+    Content address of a request; `occurrence` numbers identical requests of one run
+    (retries), so a rerun replays the same sequence of answers.
+    """
+    content = json.dumps(
+        [provider, model_name, params, prompt, occurrence],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite table of LLM responses with least-recently-used eviction once the stored
+    responses exceed `max_bytes`.
+
+    In `replay` mode the file is opened read-only: cached responses are served as
+    usual and any other request raises `ReplayMissError` instead of calling the API.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 2 << 30, replay: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if replay:
+            self.conn = sqlite3.connect(
+                f"file:{path}?mode=ro", uri=True, check_same_thread=False
+            )
+            return
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # shared with `asyncio.to_thread` workers, guarded by `self.lock`
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, "
+            "provider TEXT, model TEXT, value TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.replay:
+                with self.conn:
+                    self.conn.execute(
+                        "UPDATE responses SET last_used = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+            return json.loads(row[0])
+
+    def put(self, key: str, value: dict, provider: str = None, model: str = None):
+        if self.replay:
+            raise ReplayMissError("the LLM cache is read-only in replay mode")
+        value = json.dumps(value)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, value, len(value), time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        (total,) = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        # keep the most recently used responses that fit into `max_bytes`
+        self.conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM (SELECT key, "
+            "SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM responses) "
+            "WHERE total > ?)",
+            (self.max_bytes,),
+        )
+
+    def stats(self) -> str:
+        return f"LLM cache {self.path}: {self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_llm_cache(config) -> LLMResponseCache:
+    """Cache described by the `llm_cache` config entry, None when disabled."""
+    if not config or not config.get("mode"):
+        return None
+    if config["mode"] not in ("readwrite", "replay"):
+        raise ValueError(f"Unknown llm_cache mode: {config['mode']}")
+    return LLMResponseCache(
+        config.get("path", "outputs/llm_cache.sqlite"),
+        max_bytes=int(config.get("max_size_mb", 2048)) << 20,
+        replay=config["mode"] == "replay",
+    )
+
+
+class CachedChatModel(Runnable):
+    """
+    Drop-in wrapper of a model returned by `load_llms`: answers identical requests
+    (provider, model name, generation parameters, rendered prompt) from an
+    `LLMResponseCache` and only calls the wrapped model on a miss.
+
+    Example:
+        model = load_llms("gpt-4o", cache=LLMResponseCache("outputs/llm_cache.sqlite"))
+        output = (prompt | model).invoke({"netlist": data.netlist})
+    """
+
+    def __init__(
+        self,
+        model,
+        provider: str,
+        model_name: str,
+        cache: LLMResponseCache,
+        params: dict = None,
+    ):
+        """
+        Args:
+            params: generation parameters of the key; read from `model` if not given
+                (pass them when `model` is itself a wrapper).
+        """
+        self.model = model
+        self.provider = provider
+        self.model_name = model_name
+        self.cache = cache
+        self.generation_params = (
+            get_generation_params(model) if params is None else params
+        )
+        self.occurrences = Counter()
+        self.lock = threading.Lock()
+
+    def _request(self, input):
+        prompt = render_prompt(input)
+        base_key = get_request_key(
+            self.provider, self.model_name, self.generation_params, prompt
+        )
+        with self.lock:
+            occurrence = self.occurrences[base_key]
+            self.occurrences[base_key] += 1
+        key = get_request_key(
+            self.provider, self.model_name, self.generation_params, prompt, occurrence
+        )
+        return key, prompt
+
+    def _lookup(self, key: str):
+        value = self.cache.get(key)
+        if value is None and self.cache.replay:
+            raise ReplayMissError(f"no cached response for {self.model_name} ({key})")
+        return value
+
+    def _store(self, key: str, output):
+        if isinstance(output, str):
+            value = {"content": output, "text": True}
+        else:
+            value = {
+                "content": output.content,
+                "usage_metadata": getattr(output, "usage_metadata", None),
+            }
+        self.cache.put(key, value, self.provider, self.model_name)
+
+    @staticmethod
+    def _restore(value):
+        if value.get("text"):
+            return value["content"]
+        return AIMessage(
+            content=value["content"],
+            **(
+                {"usage_metadata": value["usage_metadata"]}
+                if value.get("usage_metadata")
+                else {}
+            ),
+        )
+
+    def invoke(self, input, config=None, **kwargs):
+        key, prompt = self._request(input)
+        value = self._lookup(key)
+        if value is not None:
+            return self._restore(value)
+        if isinstance(self.model, Runnable):
+            output = self.model.invoke(input, config, **kwargs)
+        else:
+            # e.g. `google_genai_model`, which takes the prompt text
+            output = self.model.invoke(prompt)
+        self._store(key, output)
+        return output
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        key, prompt = self._request(input)
+        value = self._lookup(key)
+        if value is not None:
+            return self._restore(value)
+        if isinstance(self.model, Runnable):
+            output = await self.model.ainvoke(input, config, **kwargs)
+        else:
+            output = await asyncio.to_thread(self.model.invoke, prompt)
+        self._store(key, output)
+        return output
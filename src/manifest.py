@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+
+from src.zip_dataset import open_file, exists, listdir, get_file_fingerprint
+
+DEFAULT_MANIFEST_PATH = "data/manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS netlists (
+    path TEXT PRIMARY KEY,
+    subset TEXT,
+    family TEXT,
+    num_transistors INTEGER,
+    num_caps INTEGER,
+    subcircuits TEXT,
+    ckt_sha1 TEXT,
+    structure_sha1 TEXT,
+    partitioning_sha1 TEXT,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS netlists_subset ON netlists (subset);
+CREATE INDEX IF NOT EXISTS netlists_family ON netlists (family);
+CREATE INDEX IF NOT EXISTS netlists_num_transistors ON netlists (num_transistors);
+"""
+
+
+def get_result_files(ckt_file: str) -> tuple[str, str]:
+    """
+    Structural-recognition and partitioning results of a netlist, for both layouts we use:
+    benchmark directories (`<dir>/structure_result.xml`) and the generated corpus
+    (`<dir>/structural_recognition.result/<name>.xml`).
+    """
+    dirname = os.path.dirname(ckt_file)
+    structure_file = os.path.join(dirname, "structure_result.xml")
+    if exists(structure_file):
+        return structure_file, os.path.join(dirname, "partitioning_result.xml")
+
+    xml_name = os.path.basename(ckt_file).replace(".ckt", ".xml")
+    return (
+        os.path.join(dirname, "structural_recognition.result", xml_name),
+        os.path.join(dirname, "partitioning.result", xml_name),
+    )
+
+
+def get_subset(ckt_file: str) -> str:
+    """`small` for `data/asi-fuboco-test/small/1/x.ckt`, `SingleOutputOpAmps` for corpus files."""
+    dirname = os.path.dirname(ckt_file)
+    if exists(os.path.join(dirname, "structure_result.xml")):
+        return os.path.basename(os.path.dirname(dirname))
+    return os.path.basename(dirname)
+
+
+def get_family(ckt_file: str) -> str:
+    """Opamp family from the generated file name, e.g. `two_stage_fully_differential_op_amp`."""
+    name = os.path.basename(ckt_file).replace(".ckt", "")
+    return re.sub(r"[_\d]+$", "", name)
+
+
+def count_devices(content: str) -> tuple[int, int]:
+    """Number of transistors and capacitors, counted like `get_devices` in the benchmark scripts."""
+    num_transistors = 0
+    num_caps = 0
+    for l in content.splitlines():
+        if ".suckt" in l or ".end" in l:
+            continue
+        device_info = l.strip().split()
+        if len(device_info) > 0:
+            if device_info[0].startswith("m"):
+                num_transistors += 1
+            elif device_info[0].startswith("c"):
+                num_caps += 1
+    return num_transistors, num_caps
+
+
+def get_subcircuit_counts(content: bytes) -> dict[str, int]:
+    """Multiset of the top-level subcircuit types in a structural-recognition result."""
+    root = ET.fromstring(content)
+    subcircuits = root[1]
+    counts = Counter()
+    for sc in subcircuits:
+        subcircuit_name = sc.attrib["name"]
+        counts[subcircuit_name[: subcircuit_name.find("[")]] += 1
+    return dict(counts)
+
+
+def read_bytes(path: str):
+    if not exists(path):
+        return None
+    with open_file(path, "rb") as f:
+        return f.read()
+
+
+def get_fingerprint(ckt_file: str) -> list:
+    fingerprint = []
+    for path in (ckt_file, *get_result_files(ckt_file)):
+        fingerprint.append(list(get_file_fingerprint(path)) if exists(path) else None)
+    return fingerprint
+
+
+def describe_netlist(ckt_file: str) -> dict:
+    """Build the manifest row of one netlist (runs in the worker processes)."""
+    structure_file, partitioning_file = get_result_files(ckt_file)
+    ckt = read_bytes(ckt_file)
+    structure = read_bytes(structure_file)
+    partitioning = read_bytes(partitioning_file)
+
+    num_transistors, num_caps = count_devices(ckt.decode("utf-8"))
+    if structure is None:
+        logger.warning(f"structural recognition result {structure_file} does not exist")
+
+    def sha1(content):
+        return hashlib.sha1(content).hexdigest() if content is not None else None
+
+    return {
+        "path": ckt_file,
+        "subset": get_subset(ckt_file),
+        "family": get_family(ckt_file),
+        "num_transistors": num_transistors,
+        "num_caps": num_caps,
+        "subcircuits": (
+            json.dumps(get_subcircuit_counts(structure))
+            if structure is not None
+            else None
+        ),
+        "ckt_sha1": sha1(ckt),
+        "structure_sha1": sha1(structure),
+        "partitioning_sha1": sha1(partitioning),
+        "fingerprint": json.dumps(get_fingerprint(ckt_file)),
+    }
+
+
+def find_benchmark_netlists(data_dir: str = "data/asi-fuboco-test") -> list[str]:
+    """`.ckt` files of a benchmark laid out as `<data_dir>/<subset>/<i>/`."""
+    ckt_files = []
+    for subset in listdir(data_dir):
+        subset_dir = os.path.join(data_dir, subset)
+        if subset.endswith(".txt"):
+            continue
+        for i in sorted((n for n in listdir(subset_dir) if n.isdigit()), key=int):
+            netlist_dir = os.path.join(subset_dir, i)
+            ckt_files += [
+                os.path.join(netlist_dir, name)
+                for name in listdir(netlist_dir)
+                if name.endswith(".ckt")
+            ]
+    return ckt_files
+
+
+class Manifest:
+    """
+    Persistent SQLite index with one row per netlist: path, subset, opamp family,
+    transistor/capacitor counts, the multiset of subcircuit types and the hashes of the
+    `.ckt` and both result files.
+
+    Rows are only recomputed for netlists whose files changed since the last `update`,
+    so bucketing and statistics over a corpus become queries instead of re-parsing
+    every `.ckt` and XML.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_MANIFEST_PATH):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def update(self, ckt_files: list[str], num_workers: int = None) -> int:
+        """Index new or changed netlists in a process pool; returns the number of rows written."""
+        stored = dict(self.conn.execute("SELECT path, fingerprint FROM netlists"))
+        changed = [
+            f for f in ckt_files if stored.get(f) != json.dumps(get_fingerprint(f))
+        ]
+        if not changed:
+            return 0
+
+        logger.info(f"indexing {len(changed)} of {len(ckt_files)} netlists")
+        if num_workers == 1:
+            rows = [describe_netlist(f) for f in changed]
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                rows = list(executor.map(describe_netlist, changed, chunksize=16))
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO netlists VALUES "
+                "(:path, :subset, :family, :num_transistors, :num_caps, :subcircuits, "
+                ":ckt_sha1, :structure_sha1, :partitioning_sha1, :fingerprint)",
+                rows,
+            )
+        return len(rows)
+
+    def prune(self) -> int:
+        """Drop rows of netlists that no longer exist."""
+        paths = [row["path"] for row in self.conn.execute("SELECT path FROM netlists")]
+        missing = [(p,) for p in paths if not exists(p)]
+        with self.conn:
+            self.conn.executemany("DELETE FROM netlists WHERE path = ?", missing)
+        return len(missing)
+
+    def select(
+        self,
+        path_glob: str = None,
+        subset: str = None,
+        family: str = None,
+        min_transistors: int = None,
+        max_transistors: int = None,
+        allowed_subcircuits: set = None,
+    ) -> list[dict]:
+        """
+        Netlists matching all given filters, ordered by path.
+
+        Args:
+            path_glob: SQLite GLOB pattern on the path (like `glob.glob`, but `*` also matches `/`).
+            min_transistors / max_transistors: half-open range `[min, max)`.
+            allowed_subcircuits: keep only netlists whose subcircuit types are a subset of it.
+        """
+        conditions = []
+        params = []
+        for clause, value in (
+            ("path GLOB ?", path_glob),
+            ("subset = ?", subset),
+            ("family = ?", family),
+            ("num_transistors >= ?", min_transistors),
+            ("num_transistors < ?", max_transistors),
+        ):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        query = "SELECT * FROM netlists"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY path"
+
+        rows = []
+        for row in self.conn.execute(query, params):
+            row = dict(row)
+            row["subcircuits"] = (
+                json.loads(row["subcircuits"])
+                if row["subcircuits"] is not None
+                else None
+            )
+            if allowed_subcircuits is not None and (
+                row["subcircuits"] is None
+                or not set(row["subcircuits"]).issubset(allowed_subcircuits)
+            ):
+                continue
+            rows.append(row)
+        return rows
+
+    def subcircuit_statistics(self, **filters):
+        """
+        Instance counts and the set of netlist directories containing each subcircuit type.
+
+        Returns:
+            `(instance_counts, circuit_counts)` like `get_rawlabels_statistic`.
+        """
+        instance_counts = defaultdict(int)
+        circuit_counts = defaultdict(set)
+        for row in self.select(**filters):
+            netlist_dir = os.path.join(os.path.dirname(row["path"]), "")
+            for name, count in (row["subcircuits"] or {}).items():
+                instance_counts[name] += count
+                circuit_counts[name].add(netlist_dir)
+        return instance_counts, circuit_counts
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    manifest = Manifest()
+    for data_dir in ["data/asi-fuboco-test", "data/asi-fuboco-train"]:
+        manifest.update(find_benchmark_netlists(data_dir))
+    print(
+        manifest.conn.execute(
+            "SELECT subset, COUNT(*) FROM netlists GROUP BY subset"
+        ).fetchall()
+    )
@@ -0,0 +1,190 @@
+import os
+import json
+import sqlite3
+import hashlib
+from collections import OrderedDict
+
+from calc1 import compute_cluster_metrics, HL1_SUBCIRCUIT_NAMES
+from examples.measure_fn2 import (
+    evaluate_graph_clustering_node_wise,
+    evaluate_graph_clustering_class_wise,
+)
+
+
+def canonical_cluster_metrics_input(predicted, ground_truth):
+    """
+    Order-free form of the inputs of `compute_cluster_metrics`.
+
+    The metric only depends on the (lower-cased, de-duplicated) member sets of the
+    clusters, on the first predicted subcircuit of every transistor and on whether the
+    first ground-truth cluster is an HL1 type, so anything else is normalized away.
+    """
+    clusters = set()
+    first_cluster_name = {}
+    for subcircuit_name, components in predicted:
+        members = tuple(sorted({t.lower() for t in components}))
+        clusters.add((subcircuit_name, members))
+        for t in components:
+            first_cluster_name.setdefault(t.lower(), subcircuit_name)
+    gt_clusters = {
+        (subcircuit_name, tuple(sorted({t.lower() for t in components})))
+        for subcircuit_name, components in ground_truth
+    }
+    return [
+        sorted(clusters),
+        sorted(first_cluster_name.items()),
+        ground_truth[0][0] in HL1_SUBCIRCUIT_NAMES,
+        sorted(gt_clusters),
+    ]
+
+
+def canonical_matching_input(predicted, ground_truth):
+    """
+    Member order/duplicates normalized, cluster order kept: the Hungarian matching of
+    the `measure_fn2` metrics may break ties differently for reordered clusters.
+    """
+    return [
+        [(name, sorted(set(components))) for name, components in clusters]
+        for clusters in (predicted, ground_truth)
+    ]
+
+
+# metric name -> (function(predicted, ground_truth), canonical form, version);
+# bump the version whenever the metric changes so cached scores are not reused
+cached_metrics = {
+    "cluster": (compute_cluster_metrics, canonical_cluster_metrics_input, 1),
+    "node_wise": (
+        lambda predicted, ground_truth: evaluate_graph_clustering_node_wise(
+            ground_truth, predicted
+        ),
+        canonical_matching_input,
+        1,
+    ),
+    "class_wise": (
+        lambda predicted, ground_truth: evaluate_graph_clustering_class_wise(
+            ground_truth, predicted
+        ),
+        canonical_matching_input,
+        1,
+    ),
+}
+
+
+def get_metric_key(metric: str, predicted, ground_truth) -> str:
+    """Content address of a (prediction, ground truth, metric version) triple."""
+    _, canonicalize, version = cached_metrics[metric]
+    content = json.dumps(
+        [metric, version, canonicalize(predicted, ground_truth)],
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class MetricCache:
+    """
+    Memoized metric functions: a bounded in-memory LRU in front of an optional SQLite
+    table shared by processes and runs.
+
+    Example:
+        cache = MetricCache(disk_path=".cache/metrics.sqlite")
+        scores = cache.compute("cluster", predicted, data.hl2_gt)
+    """
+
+    def __init__(self, maxsize: int = 65536, disk_path: str = None):
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_path = disk_path
+        self.conn = None
+        if disk_path is not None:
+            if os.path.dirname(disk_path):
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self.conn = sqlite3.connect(disk_path, timeout=60)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS metrics (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def _remember(self, key: str, value: dict):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory.move_to_end(key)
+            return value
+        if self.conn is not None:
+            row = self.conn.execute(
+                "SELECT value FROM metrics WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value)
+                return value
+        return None
+
+    def put(self, key: str, value: dict):
+        self._remember(key, value)
+        if self.conn is not None:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO metrics VALUES (?, ?)",
+                    (key, json.dumps(value)),
+                )
+
+    def compute(self, metric: str, predicted, ground_truth, function=None) -> dict:
+        """
+        `cached_metrics[metric]` of the pair, computed at most once per content.
+
+        `function` (no arguments) computes the same scores on a miss, e.g. the bound
+        method of an `EvaluationContext` that already holds the pair.
+        """
+        if function is None:
+            function = lambda: cached_metrics[metric][0](predicted, ground_truth)
+        try:
+            key = get_metric_key(metric, predicted, ground_truth)
+        except (TypeError, AttributeError, ValueError, IndexError):
+            # malformed LLM output: let the metric itself decide what to do
+            return function()
+
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return dict(value)
+        self.misses += 1
+        value = {
+            k: v.item() if hasattr(v, "item") else v for k, v in function().items()
+        }
+        self.put(key, value)
+        return dict(value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.conn is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM metrics")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+_default_cache = None
+
+
+def get_metric_cache() -> MetricCache:
+    """Process-wide in-memory cache (add a disk tier with `$ASI_LLM_METRIC_CACHE`)."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MetricCache(disk_path=os.getenv("ASI_LLM_METRIC_CACHE"))
+    return _default_cache
+
+
+def cached_compute_cluster_metrics(predicted, ground_truth) -> dict:
+    """Drop-in replacement of `compute_cluster_metrics` backed by `get_metric_cache()`."""
+    return get_metric_cache().compute("cluster", predicted, ground_truth)
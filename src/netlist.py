@@ -1,77 +1,108 @@
-from calc1 import merge_cm_transistor_cluster
-from src.extract_circuit_info import (
-    get_hl1_cluster_labels,
-    get_hl2_cluster_labels,
-    get_hl3_cluster_labels,
-)
-from mask_net import get_masked_netlist
+from src.netlist_cache import compile_netlist, load_compiled_netlist
+from src.device_table import DeviceTable
+from functools import cached_property
 from collections import defaultdict
 from typing import Dict, Tuple, List
+import numpy as np
+
+# label names of each hierarchical level, in label-ID order (IDs start at 1)
+hierarchical_level_labels = {
+    "HL1": ["MosfetDiode", "load_cap", "compensation_cap"],
+    "HL2": ["DiffPair", "CM", "Inverter"],
+    "HL3": [
+        "firstStage",
+        "secondStage",
+        "thirdStage",
+        "loadPart",
+        "biasPart",
+        "feedBack",
+    ],
+}
+subcircuit_name_to_label_ids_mapping = {
+    name: label_id
+    for names in hierarchical_level_labels.values()
+    for label_id, name in enumerate(names, start=1)
+}
 
 
 class SPICENetlist:
-    def __init__(self, netlist_path):
-        self.netlist = get_masked_netlist(netlist_path, use_meaninful_token=True)
-        self.hl1_gt = get_hl1_cluster_labels(netlist_path)
-        self.hl2_gt = merge_cm_transistor_cluster(get_hl2_cluster_labels(netlist_path))
-        self.hl3_gt = get_hl3_cluster_labels(netlist_path)
+    def __init__(self, netlist_path, use_cache=True):
+        if use_cache:
+            compiled = load_compiled_netlist(netlist_path)
+        else:
+            compiled = compile_netlist(netlist_path)
+        self.netlist = compiled["netlist"]
+        # original net name <-> masked net name
+        self.net_mapping = compiled["net_mapping"]
+        self.reverse_net_mapping = compiled["reverse_net_mapping"]
+        self.hl1_gt = compiled["hl1_gt"]
+        self.hl2_gt = compiled["hl2_gt"]
+        self.hl3_gt = compiled["hl3_gt"]
+
+    @cached_property
+    def device_table(self) -> DeviceTable:
+        return DeviceTable(self.netlist)
 
     @property
     def num_transistors(self):
-        count = 0
-        for component in self.netlist.strip().split("\n"):
-            infos = component.split(" ")
-            component_name = infos[0]
-            if component_name.startswith("m"):
-                count += 1
-        return count
+        return self.device_table.num_transistors
+
+    @cached_property
+    def label_index(self) -> Dict[str, Tuple[List, List, List]]:
+        """
+        Inverted index component name -> (HL1 label IDs, HL2 label IDs, HL3 label IDs),
+        built with a single pass over the clusters of every level.
+        """
+        index = {name: ([], [], []) for name in self.device_table.names}
+        for level, clusters in enumerate((self.hl1_gt, self.hl2_gt, self.hl3_gt)):
+            for subcircuit_name, subcircuit_components in clusters:
+                for component_name in dict.fromkeys(subcircuit_components):
+                    if component_name in index:
+                        index[component_name][level].append(
+                            subcircuit_name_to_label_ids_mapping[subcircuit_name]
+                        )
+        return index
 
     @property
     def get_graph_labels(self) -> Dict[str, Tuple[List, List, List]]:
         labels = defaultdict(list)
-        subcircuit_name_to_label_ids_mapping = {
-            "MosfetDiode": 1,
-            "load_cap": 2,
-            "compensation_cap": 3,
-            "DiffPair": 1,
-            "CM": 2,
-            "Inverter": 3,
-            "firstStage": 1,
-            "secondStage": 2,
-            "thirdStage": 3,
-            "loadPart": 4,
-            "biasPart": 5,
-            "feedBack": 6,
-        }
-        for component in self.netlist.strip().split("\n"):
-            infos = component.split(" ")
-            component_name = infos[0]
-
-            # get label for HL1
-            hl1_labels = []
-            for subcircuit_name, subcircuit_components in self.hl1_gt:
-                if component_name in subcircuit_components:
-                    hl1_labels += [
-                        subcircuit_name_to_label_ids_mapping[subcircuit_name]
-                    ]
-            labels[component_name].append(hl1_labels)
+        for component_name, level_labels in self.label_index.items():
+            labels[component_name] = [list(l) for l in level_labels]
+        return labels
 
-            # get label for HL2
-            hl2_labels = []
-            for subcircuit_name, subcircuit_components in self.hl2_gt:
-                if component_name in subcircuit_components:
-                    hl2_labels += [
-                        subcircuit_name_to_label_ids_mapping[subcircuit_name]
-                    ]
-            labels[component_name].append(hl2_labels)
+    def get_multi_hot_labels(self, level: str) -> np.ndarray:
+        """
+        Dense multi-hot label matrix of one hierarchical level.
 
-            # get label for HL3
-            hl3_labels = []
-            for subcircuit_name, subcircuit_components in self.hl3_gt:
-                if component_name in subcircuit_components:
-                    hl3_labels += [
-                        subcircuit_name_to_label_ids_mapping[subcircuit_name]
-                    ]
-            labels[component_name].append(hl3_labels)
+        Args:
+            level: "HL1", "HL2" or "HL3".
 
+        Returns:
+            uint8 array of shape (num_devices, num_labels) aligned with `device_table` rows;
+            column `j` is the label `hierarchical_level_labels[level][j]`.
+        """
+        level_id = int(level[-1]) - 1
+        labels = np.zeros(
+            (len(self.device_table), len(hierarchical_level_labels[level])),
+            dtype=np.uint8,
+        )
+        for component_name, level_labels in self.label_index.items():
+            for label_id in level_labels[level_id]:
+                labels[self.device_table.index[component_name], label_id - 1] = 1
         return labels
+
+
+def stack_multi_hot_labels(netlists: List[SPICENetlist], level: str):
+    """
+    Concatenate the multi-hot labels of many netlists (e.g. a whole subset).
+
+    Returns:
+        Tuple `(labels, offsets)` where the rows of netlist `i` are
+        `labels[offsets[i] : offsets[i + 1]]`.
+    """
+    matrices = [data.get_multi_hot_labels(level) for data in netlists]
+    offsets = np.zeros(len(matrices) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(m) for m in matrices])
+    if not matrices:
+        return np.zeros((0, len(hierarchical_level_labels[level])), np.uint8), offsets
+    return np.concatenate(matrices), offsets
@@ -0,0 +1,109 @@
+import os
+import glob
+import pickle
+import hashlib
+
+from loguru import logger
+
+from calc1 import merge_cm_transistor_cluster
+from src.extract_circuit_info import get_all_cluster_labels
+from mask_net import get_masked_netlist_with_mapping
+from src.zip_dataset import glob_files, get_file_fingerprint
+
+# bump this whenever the layout of a compiled entry (or the way the labels are
+# extracted) changes, so stale pickles are rebuilt instead of being trusted.
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.getenv("ASI_LLM_CACHE_DIR", ".cache/netlists")
+
+
+def get_source_files(netlist_dir: str) -> list[str]:
+    """Return the three files a compiled netlist is derived from."""
+    return [
+        glob_files(netlist_dir, "*.ckt")[0],
+        os.path.join(netlist_dir, "structure_result.xml"),
+        os.path.join(netlist_dir, "partitioning_result.xml"),
+    ]
+
+
+def get_fingerprint(netlist_dir: str) -> list[tuple]:
+    """Fingerprint of every source file (see `get_file_fingerprint`); any change invalidates the cache."""
+    return [get_file_fingerprint(path) for path in get_source_files(netlist_dir)]
+
+
+def compile_netlist(netlist_dir: str) -> dict:
+    """Mask the netlist and extract the HL1/HL2/HL3 ground truth (the slow path)."""
+    hl1_gt, hl2_gt, hl3_gt = get_all_cluster_labels(netlist_dir)
+    netlist, net_mapping, reverse_net_mapping = get_masked_netlist_with_mapping(
+        netlist_dir, use_meaninful_token=True
+    )
+    return {
+        "netlist": netlist,
+        "net_mapping": net_mapping,
+        "reverse_net_mapping": reverse_net_mapping,
+        "hl1_gt": hl1_gt,
+        "hl2_gt": merge_cm_transistor_cluster(hl2_gt),
+        "hl3_gt": hl3_gt,
+    }
+
+
+def get_cache_path(netlist_dir: str, cache_dir: str = None) -> str:
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    key = hashlib.sha1(os.path.abspath(netlist_dir).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.pkl")
+
+
+def load_compiled_netlist(netlist_dir: str, cache_dir: str = None) -> dict:
+    """
+    Load the compiled netlist from the on-disk cache, rebuilding it when the
+    sources changed since it was written.
+
+    Args:
+        netlist_dir: directory containing the `.ckt` and both result XML files.
+        cache_dir: where the cache entries live (default: `$ASI_LLM_CACHE_DIR` or `.cache/netlists`).
+
+    Returns:
+        Dictionary with the keys `netlist`, `net_mapping`, `reverse_net_mapping`,
+        `hl1_gt`, `hl2_gt` and `hl3_gt`.
+    """
+    cache_path = get_cache_path(netlist_dir, cache_dir)
+    fingerprint = get_fingerprint(netlist_dir)
+
+    try:
+        with open(cache_path, "rb") as f:
+            entry = pickle.load(f)
+        if entry["version"] == CACHE_VERSION and entry["fingerprint"] == fingerprint:
+            return entry["data"]
+        logger.debug(f"stale netlist cache entry for {netlist_dir}, rebuilding")
+    except FileNotFoundError:
+        pass
+    except (pickle.UnpicklingError, EOFError, KeyError, TypeError) as e:
+        logger.warning(f"corrupted netlist cache entry {cache_path}: {e}")
+
+    data = compile_netlist(netlist_dir)
+    entry = {"version": CACHE_VERSION, "fingerprint": fingerprint, "data": data}
+
+    # write to a temporary file first so concurrent readers never see a partial pickle
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return data
+
+
+def clear_cache(cache_dir: str = None) -> int:
+    """Remove every cache entry and return how many were deleted."""
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    removed = 0
+    for path in glob.glob(os.path.join(cache_dir, "*.pkl")):
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    # warm the cache for the whole test set
+    for subset in ["small", "medium", "large"]:
+        for i in range(1, 101):
+            load_compiled_netlist(f"data/asi-fuboco-test/{subset}/{i}/")
@@ -0,0 +1,291 @@
+import time
+import random
+import asyncio
+import threading
+
+from loguru import logger
+from langchain_core.runnables import Runnable
+
+from src.llm_cache import render_prompt, get_generation_params
+
+# answers assumed per request until the provider reports the real token usage
+DEFAULT_OUTPUT_TOKENS = 1024
+# longest single sleep of a waiting request, so freed slots are noticed quickly
+MAX_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """
+    `per_minute` units refilled continuously, at most `burst` (default one minute's
+    worth) available at once. Charges may exceed the balance, e.g. when the real token
+    usage of a request turns out larger than estimated: the debt delays later requests.
+    """
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (at most `capacity`) units are available."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing, 0) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+
+def get_status_code(error: Exception):
+    """HTTP status of a provider error (openai/httpx style), None if unknown."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None and "RateLimit" in type(error).__name__:
+        status = 429
+    return status
+
+
+def get_retry_after(error: Exception) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def is_retryable(status) -> bool:
+    return status == 429 or (status is not None and 500 <= status < 600)
+
+
+class ProviderScheduler:
+    """
+    Admission control for the requests of one provider.
+
+    A request waits until (1) fewer than `concurrency` requests are in flight, (2) the
+    requests-per-minute bucket has a request left and (3) the tokens-per-minute bucket
+    covers its estimated tokens; the estimate is corrected with the reported usage.
+    `concurrency` adapts AIMD-style: +1/concurrency after every fast success, halved
+    (at most once per `cooldown` seconds) on 429/5xx answers or when a request takes
+    longer than `target_latency`. Throttled and failed requests are retried with
+    jittered exponential backoff (or the provider's `retry-after`).
+
+    Example:
+        scheduler = ProviderScheduler("openai", rpm=500, tpm=30000)
+        output = await scheduler.run(lambda: chain.ainvoke(inputs), tokens=2000)
+        logger.info(scheduler.stats())
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        rpm: float = None,
+        tpm: float = None,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        initial_concurrency: float = 4,
+        target_latency: float = None,
+        max_retries: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        cooldown: float = 1.0,
+    ):
+        self.provider = provider
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(
+            min(max(initial_concurrency, min_concurrency), max_concurrency)
+        )
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.cooldown = cooldown
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.last_decrease = 0.0
+        self.num_requests = 0
+        self.num_throttled = 0
+        self.num_retries = 0
+
+    def _try_admit(self, tokens: float) -> float:
+        """Admit the request (returns 0) or return how long to wait before trying again."""
+        with self.lock:
+            if self.in_flight >= int(self.concurrency):
+                return MAX_POLL_INTERVAL
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return min(wait, MAX_POLL_INTERVAL)
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            self.num_requests += 1
+            return 0.0
+
+    def _release(self, started: float, status=None, token_correction: float = 0):
+        """Record a finished request; `status` is the HTTP status of a failed one."""
+        latency = time.monotonic() - started
+        with self.lock:
+            self.in_flight -= 1
+            if self.tokens is not None:
+                self.tokens.take(token_correction)
+            slow = self.target_latency is not None and latency > self.target_latency
+            if is_retryable(status) or slow:
+                if is_retryable(status):
+                    self.num_throttled += 1
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.last_decrease = now
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            elif status is None:
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1 / self.concurrency
+                )
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2**attempt)
+        delay *= random.uniform(0.5, 1.5)
+        return max(delay, get_retry_after(error))
+
+    def _give_up(self, attempt: int, error: Exception) -> bool:
+        status = get_status_code(error)
+        if not is_retryable(status) or attempt == self.max_retries:
+            return True
+        with self.lock:
+            self.num_retries += 1
+        logger.warning(f"{self.provider}: HTTP {status}, retrying ({self.stats()})")
+        return False
+
+    @staticmethod
+    def _used_tokens(output, estimate: float) -> float:
+        usage = getattr(output, "usage_metadata", None) or {}
+        return usage.get("total_tokens", estimate)
+
+    async def run(self, function, tokens: float = 0):
+        """Await `function()` (a coroutine function) once admitted, retrying throttled calls."""
+        for attempt in range(self.max_retries + 1):
+            with self.lock:
+                self.queue_depth += 1
+            try:
+                while (wait := self._try_admit(tokens)) > 0:
+                    await asyncio.sleep(wait)
+            finally:
+                with self.lock:
+                    self.queue_depth -= 1
+
+            started = time.monotonic()
+            try:
+                output = await function()
+            except Exception as e:
+                self._release(started, get_status_code(e) or 0)
+                if self._give_up(attempt, e):
+                    raise
+                await asyncio.sleep(self.backoff(attempt, e))
+                continue
+            self._release(
+                started, token_correction=self._used_tokens(output, tokens) - tokens
+            )
+            return output
+
+    def call(self, function, tokens: float = 0):
+        """Blocking `run` for the sequential evaluation loop (thread-safe)."""
+        for attempt in range(self.max_retries + 1):
+            with self.lock:
+                self.queue_depth += 1
+            try:
+                while (wait := self._try_admit(tokens)) > 0:
+                    time.sleep(wait)
+            finally:
+                with self.lock:
+                    self.queue_depth -= 1
+
+            started = time.monotonic()
+            try:
+                output = function()
+            except Exception as e:
+                self._release(started, get_status_code(e) or 0)
+                if self._give_up(attempt, e):
+                    raise
+                time.sleep(self.backoff(attempt, e))
+                continue
+            self._release(
+                started, token_correction=self._used_tokens(output, tokens) - tokens
+            )
+            return output
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "provider": self.provider,
+                "concurrency": round(self.concurrency, 2),
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "requests": self.num_requests,
+                "throttled": self.num_throttled,
+                "retries": self.num_retries,
+            }
+
+
+# one scheduler per provider, shared by all its models and evaluation loops
+_schedulers = {}
+
+
+def get_scheduler(provider: str, rate_limits) -> ProviderScheduler:
+    """Scheduler of `provider` configured by its `rate_limits` entry, None if it has none."""
+    if not rate_limits or not rate_limits.get(provider):
+        return None
+    if provider not in _schedulers:
+        _schedulers[provider] = ProviderScheduler(provider, **rate_limits[provider])
+    return _schedulers[provider]
+
+
+class RateLimitedChatModel(Runnable):
+    """Wrapper of a model returned by `load_llms` sending every request through a `ProviderScheduler`."""
+
+    def __init__(
+        self,
+        model,
+        scheduler: ProviderScheduler,
+        output_tokens: int = DEFAULT_OUTPUT_TOKENS,
+    ):
+        self.model = model
+        self.scheduler = scheduler
+        self.output_tokens = output_tokens
+        self.generation_params = get_generation_params(model)
+
+    def estimate_tokens(self, prompt: str) -> int:
+        # ~4 characters per token for the prompt, plus the expected answer
+        return len(prompt) // 4 + self.output_tokens
+
+    def invoke(self, input, config=None, **kwargs):
+        prompt = render_prompt(input)
+        if isinstance(self.model, Runnable):
+            function = lambda: self.model.invoke(input, config, **kwargs)
+        else:
+            # e.g. `google_genai_model`, which takes the prompt text
+            function = lambda: self.model.invoke(prompt)
+        return self.scheduler.call(function, self.estimate_tokens(prompt))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        prompt = render_prompt(input)
+        if isinstance(self.model, Runnable):
+            function = lambda: self.model.ainvoke(input, config, **kwargs)
+        else:
+            function = lambda: asyncio.to_thread(self.model.invoke, prompt)
+        return await self.scheduler.run(function, self.estimate_tokens(prompt))
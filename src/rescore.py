@@ -0,0 +1,247 @@
+import os
+import re
+import csv
+import json
+import click
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+
+from calc1 import MetricAccumulator
+from src.confusion_matrix import merge_confusion_matrices
+from src.evaluation_context import EvaluationContext, metric_functions
+from src.metric_cache import MetricCache, cached_metrics
+from src.netlist import SPICENetlist
+
+# columns identifying a work unit, from
+# outputs/<result_dir>/<model>/llm_outputs/<category>/<subset>/netlist_<i>/
+UNIT_KEYS = ("result_dir", "model", "category", "subset", "netlist")
+
+
+# per-process metric caches, see `get_worker_cache`
+_worker_caches = {}
+
+
+def get_worker_cache(disk_path: str) -> MetricCache:
+    cache = _worker_caches.get(disk_path)
+    if cache is None:
+        cache = _worker_caches[disk_path] = MetricCache(disk_path=disk_path)
+    return cache
+
+
+def find_work_units(outputs_dir: str = "outputs") -> list[dict]:
+    """Every `netlist_<i>/` directory below an `llm_outputs/<category>/<subset>/` folder."""
+    units = []
+    for root, dirs, files in os.walk(outputs_dir):
+        parts = os.path.relpath(root, outputs_dir).split(os.sep)
+        if len(parts) < 6 or parts[-4] != "llm_outputs":
+            continue
+        # failed units of older runs only hold `output_<k>.txt`, so no file is required
+        if not re.fullmatch(r"netlist_\d+", parts[-1]):
+            continue
+        dirs[:] = []
+        units.append(
+            {
+                "result_dir": "/".join(parts[:-5]),
+                "model": parts[-5],
+                "category": parts[-3],
+                "subset": parts[-2],
+                "netlist": int(parts[-1][len("netlist_") :]),
+                "path": root,
+            }
+        )
+    units.sort(key=lambda u: tuple(u[k] for k in UNIT_KEYS))
+    return units
+
+
+def load_unit(unit: dict, data_dir: str = "data/asi-fuboco-test"):
+    """
+    Prediction and ground truth of a work unit (prediction is None if the LLM call failed).
+
+    The ground truth is read from `gt.json`, or from the netlist in `data_dir` for
+    units without one (failed units of runs that did not save it).
+    """
+    level = unit["category"][:3]
+    gt_path = os.path.join(unit["path"], "gt.json")
+    if os.path.exists(gt_path):
+        with open(gt_path, "r") as fr:
+            ground_truth = json.load(fr)[f"{level.lower()}_gt"]
+    else:
+        data = SPICENetlist(f"{data_dir}/{unit['subset']}/{unit['netlist']}/")
+        ground_truth = getattr(data, f"{level.lower()}_gt")
+
+    parsed_data_path = os.path.join(unit["path"], "parsed_data.json")
+    if not os.path.exists(parsed_data_path):
+        return level, None, ground_truth
+    with open(parsed_data_path, "r") as fr:
+        prediction = json.load(fr)
+    return level, prediction, ground_truth
+
+
+def score_unit(args):
+    """Apply the selected metrics to one work unit (runs in the worker processes)."""
+    unit, metrics, metric_cache, data_dir = args
+    cache = get_worker_cache(metric_cache) if metric_cache is not None else None
+    row = {k: unit[k] for k in UNIT_KEYS}
+    confusion = None
+    try:
+        level, prediction, ground_truth = load_unit(unit, data_dir)
+        if prediction is None:
+            # scored as zeros, like `save_netlist_result` does
+            if "cluster" in metrics:
+                row.update(
+                    {
+                        f"cluster.{key}": 0.0
+                        for key in ("Precision", "Recall", "F1-score")
+                    }
+                )
+            row["status"] = "failed"
+            return row, confusion
+        prediction = [(name, components) for name, components in prediction]
+        # every metric is served from the indexes built once for this unit
+        context = EvaluationContext(ground_truth, prediction, level)
+        for metric in metrics:
+            if cache is not None and metric in cached_metrics:
+                result = cache.compute(
+                    metric,
+                    prediction,
+                    ground_truth,
+                    lambda: metric_functions[metric](context),
+                )
+            else:
+                result = metric_functions[metric](context)
+            if metric == "confusion":
+                confusion = result
+                continue
+            for key, value in result.items():
+                row[f"{metric}.{key}"] = float(value)
+        row["status"] = "ok"
+    except Exception as e:
+        row["status"] = f"invalid: {type(e).__name__}: {e}"
+    return row, confusion
+
+
+def write_table(rows: list[dict], path: str, columns: list[str] = ()):
+    """CSV with the union of the columns of all rows (empty cells for missing values)."""
+    columns = list(columns)
+    for row in rows:
+        columns += [k for k in row if k not in columns]
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="") as fw:
+        writer = csv.DictWriter(fw, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def summarize(rows: list[dict]) -> list[dict]:
+    """
+    Macro mean of the `cluster` scores per run (result_dir, model, category, subset);
+    failed or invalid units count as zeros like in `find_subcircuits`.
+    """
+    accumulators = defaultdict(MetricAccumulator)
+    for row in rows:
+        key = tuple(row[k] for k in UNIT_KEYS[:-1])
+        accumulators[key].update(
+            {
+                metric: row.get(f"cluster.{metric}", 0)
+                for metric in ("Precision", "Recall", "F1-score")
+            }
+        )
+    return [
+        {**dict(zip(UNIT_KEYS[:-1], key)), **accumulator.summary()}
+        for key, accumulator in sorted(accumulators.items())
+    ]
+
+
+def rescore(
+    outputs_dir: str = "outputs",
+    output: str = "outputs/rescore.csv",
+    metrics: list[str] = ("cluster",),
+    num_workers: int = None,
+    metric_cache: str = None,
+    data_dir: str = "data/asi-fuboco-test",
+):
+    """
+    Re-score every archived LLM output below `outputs_dir` without calling any LLM.
+
+    Writes `output` (one row per netlist and run), next to it `<name>.summary.csv`
+    (macro means of the cluster metric per run) and, with the `confusion` metric,
+    `<name>.confusion.json` (aggregated confusion matrices per run).
+
+    Args:
+        metric_cache: SQLite file memoizing scores across runs (see `MetricCache`).
+        data_dir: benchmark the ground truth of units without `gt.json` is read from.
+    """
+    unknown = set(metrics) - set(metric_functions)
+    if unknown:
+        raise ValueError(f"unknown metrics: {sorted(unknown)}")
+
+    units = find_work_units(outputs_dir)
+    logger.info(f"re-scoring {len(units)} LLM outputs with {list(metrics)}")
+    jobs = [(unit, list(metrics), metric_cache, data_dir) for unit in units]
+    if num_workers == 1:
+        results = list(map(score_unit, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(score_unit, jobs, chunksize=32))
+
+    rows = [row for row, _ in results]
+    write_table(rows, output, UNIT_KEYS + ("status",))
+    if "cluster" in metrics:
+        write_table(
+            summarize(rows),
+            f"{os.path.splitext(output)[0]}.summary.csv",
+            UNIT_KEYS[:-1],
+        )
+
+    if "confusion" in metrics:
+        runs = defaultdict(list)
+        for row, confusion in results:
+            if confusion is not None:
+                key = "/".join(str(row[k]) for k in UNIT_KEYS[:-1])
+                runs[key].append({confusion.level: confusion})
+        with open(f"{os.path.splitext(output)[0]}.confusion.json", "w") as fw:
+            json.dump(
+                {
+                    key: {
+                        level: matrix.to_dict()
+                        for level, matrix in merge_confusion_matrices(levels).items()
+                    }
+                    for key, levels in runs.items()
+                },
+                fw,
+            )
+    return rows
+
+
+@click.command()
+@click.argument("outputs_dir", default="outputs")
+@click.option("--output", default="outputs/rescore.csv", help="consolidated table.")
+@click.option(
+    "--metrics",
+    default="cluster",
+    help=f"comma-separated subset of {','.join(metric_functions)}.",
+)
+@click.option("--num_workers", default=None, type=int, help="worker processes.")
+@click.option(
+    "--metric_cache",
+    default=None,
+    help="SQLite file memoizing scores of identical (prediction, ground truth) pairs.",
+)
+@click.option(
+    "--data_dir",
+    default="data/asi-fuboco-test",
+    help="benchmark providing the ground truth of units without gt.json.",
+)
+def main(outputs_dir, output, metrics, num_workers, metric_cache, data_dir):
+    rescore(
+        outputs_dir, output, metrics.split(","), num_workers, metric_cache, data_dir
+    )
+
+
+if __name__ == "__main__":
+    main()
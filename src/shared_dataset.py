@@ -0,0 +1,350 @@
+import os
+import json
+import mmap
+import struct
+from functools import cached_property
+from multiprocessing import shared_memory, util
+
+import numpy as np
+
+from src.device_table import DeviceTable
+from src.netlist import SPICENetlist, hierarchical_level_labels, stack_multi_hot_labels
+
+MAGIC = b"ASIPACK1"
+# magic + length of the JSON header
+PREAMBLE = struct.Struct("<8sQ")
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _concat_bytes(chunks: list[bytes]):
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in chunks])
+    return np.frombuffer(b"".join(chunks), dtype=np.uint8), offsets
+
+
+def pack_netlists(netlists: list[SPICENetlist], paths: list[str] = None) -> dict:
+    """
+    Flatten parsed netlists into named arrays; netlist `i` owns the slices
+    `[*_offsets[i] : *_offsets[i + 1]]` of the concatenated sections:
+
+        - `text`: the masked netlists (utf-8)
+        - `meta`: JSON with device/net names, net mappings, ground truth and source path
+        - `types`, `terminals`: the `DeviceTable` columns, one row per device
+        - `labels_HL1/2/3`: multi-hot labels aligned with the device rows
+    """
+    paths = paths or [None] * len(netlists)
+    text, text_offsets = _concat_bytes(
+        [data.netlist.encode("utf-8") for data in netlists]
+    )
+    meta, meta_offsets = _concat_bytes(
+        [
+            json.dumps(
+                {
+                    "path": path,
+                    "names": data.device_table.names,
+                    "nets": data.device_table.nets,
+                    "net_mapping": data.net_mapping,
+                    "reverse_net_mapping": data.reverse_net_mapping,
+                    "hl1_gt": data.hl1_gt,
+                    "hl2_gt": data.hl2_gt,
+                    "hl3_gt": data.hl3_gt,
+                }
+            ).encode("utf-8")
+            for data, path in zip(netlists, paths)
+        ]
+    )
+
+    tables = [data.device_table for data in netlists]
+    device_offsets = np.zeros(len(tables) + 1, dtype=np.int64)
+    device_offsets[1:] = np.cumsum([len(t) for t in tables])
+    sections = {
+        "text": text,
+        "text_offsets": text_offsets,
+        "meta": meta,
+        "meta_offsets": meta_offsets,
+        "device_offsets": device_offsets,
+        "types": np.concatenate([t.types for t in tables] or [np.zeros(0, np.int8)]),
+        "terminals": np.concatenate(
+            [t.terminals for t in tables] or [np.zeros((0, 4), np.int32)]
+        ),
+    }
+    for level in hierarchical_level_labels:
+        sections[f"labels_{level}"], _ = stack_multi_hot_labels(netlists, level)
+    return sections
+
+
+def layout_sections(sections: dict) -> tuple[bytes, int]:
+    """Serialize the header describing where each section lives; returns `(header, total size)`."""
+    entries = {}
+    # the header length depends on the offsets, so reserve a generous upper bound first
+    offset = _align(PREAMBLE.size + 256 * (len(sections) + 1))
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array)
+        entries[name] = {
+            "offset": offset,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+        }
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"sections": entries}).encode("utf-8")
+    assert PREAMBLE.size + len(header) <= entries[next(iter(entries))]["offset"]
+    return header, max(offset, 1)
+
+
+def write_sections(buf, header: bytes, sections: dict):
+    buf[: PREAMBLE.size] = PREAMBLE.pack(MAGIC, len(header))
+    buf[PREAMBLE.size : PREAMBLE.size + len(header)] = header
+    entries = json.loads(header)["sections"]
+    for name, array in sections.items():
+        data = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+        offset = entries[name]["offset"]
+        buf[offset : offset + len(data)] = data
+
+
+# buffers this process already attached to, so every task sent to a worker reuses them
+_attached = {}
+
+
+def attach_benchmark(name: str = None, path: str = None) -> "SharedBenchmark":
+    """Module-level constructor so that pickled handles can be re-attached in workers."""
+    benchmark = _attached.get((name, path))
+    if benchmark is None or benchmark._buf is None:
+        benchmark = _attached[(name, path)] = SharedBenchmark.attach(
+            name=name, path=path
+        )
+        # pool workers leave through multiprocessing's exit hooks, not `atexit`; detach
+        # there, before the interpreter tears down the segment with live views
+        util.Finalize(benchmark, benchmark.close, exitpriority=10)
+    return benchmark
+
+
+class SharedNetlist:
+    """
+    Read-only stand-in for `SPICENetlist` backed by a `SharedBenchmark` slice.
+
+    The device table and label matrices are zero-copy views into the shared buffer;
+    the netlist text and the JSON metadata are only decoded when accessed.
+    """
+
+    def __init__(self, benchmark: "SharedBenchmark", position: int):
+        self.benchmark = benchmark
+        self.position = position
+
+    def _slice(self, section: str):
+        offsets = self.benchmark.arrays[f"{section}_offsets"]
+        return offsets[self.position], offsets[self.position + 1]
+
+    @cached_property
+    def netlist(self) -> str:
+        start, end = self._slice("text")
+        return self.benchmark.arrays["text"][start:end].tobytes().decode("utf-8")
+
+    @cached_property
+    def meta(self) -> dict:
+        start, end = self._slice("meta")
+        return json.loads(self.benchmark.arrays["meta"][start:end].tobytes())
+
+    @property
+    def path(self) -> str:
+        return self.meta["path"]
+
+    @property
+    def net_mapping(self) -> dict:
+        return self.meta["net_mapping"]
+
+    @property
+    def reverse_net_mapping(self) -> dict:
+        return self.meta["reverse_net_mapping"]
+
+    @cached_property
+    def hl1_gt(self):
+        return [tuple(cluster) for cluster in self.meta["hl1_gt"]]
+
+    @cached_property
+    def hl2_gt(self):
+        return [tuple(cluster) for cluster in self.meta["hl2_gt"]]
+
+    @cached_property
+    def hl3_gt(self):
+        return [tuple(cluster) for cluster in self.meta["hl3_gt"]]
+
+    @property
+    def device_rows(self) -> slice:
+        start, end = self._slice("device")
+        return slice(int(start), int(end))
+
+    @cached_property
+    def device_table(self) -> DeviceTable:
+        rows = self.device_rows
+        return DeviceTable.from_arrays(
+            self.meta["names"],
+            self.meta["nets"],
+            self.benchmark.arrays["types"][rows],
+            self.benchmark.arrays["terminals"][rows],
+        )
+
+    @property
+    def num_transistors(self):
+        return self.device_table.num_transistors
+
+    def get_multi_hot_labels(self, level: str) -> np.ndarray:
+        """Same as `SPICENetlist.get_multi_hot_labels`, as a read-only view."""
+        return self.benchmark.arrays[f"labels_{level}"][self.device_rows]
+
+
+class SharedBenchmark:
+    """
+    Parsed netlists packed into one contiguous buffer that worker processes attach to
+    instead of re-loading (or unpickling) every `SPICENetlist`.
+
+    The buffer starts with a small JSON header (section name -> offset, dtype, shape)
+    followed by 64-byte aligned sections (see `pack_netlists`). It lives either in
+    POSIX shared memory (`name`) or in a memory-mapped file (`path`); pickling a
+    `SharedBenchmark` only sends that handle, so pool workers attach in O(1) and all
+    arrays are views into pages shared with every other process.
+
+    Example:
+        with SharedBenchmark.from_dataset(BenchmarkDataset("small")) as benchmark:
+            with ProcessPoolExecutor(8) as executor:
+                executor.map(evaluate, [(benchmark, i) for i in range(len(benchmark))])
+
+    The creating process owns the segment: `close()` there also unlinks it. Workers
+    started from the owner share its resource tracker; unrelated processes should
+    use the file-backed variant, which is not tied to the owner's lifetime.
+    """
+
+    def __init__(self, buf, shm=None, mm=None, path=None, owner=False):
+        self._buf = buf
+        self._shm = shm
+        self._mm = mm
+        self.path = path
+        self.owner = owner
+
+        magic, header_size = PREAMBLE.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("not a packed benchmark buffer")
+        header = json.loads(bytes(buf[PREAMBLE.size : PREAMBLE.size + header_size]))
+        self.arrays = {}
+        for name, entry in header["sections"].items():
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"], dtype=np.int64))
+            array = np.frombuffer(buf, dtype=dtype, count=count, offset=entry["offset"])
+            array = array.reshape(entry["shape"])
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @cached_property
+    def paths(self) -> list[str]:
+        return [netlist.path for netlist in self]
+
+    @property
+    def name(self) -> str:
+        return self._shm.name if self._shm is not None else None
+
+    @classmethod
+    def create(
+        cls,
+        netlists: list[SPICENetlist],
+        paths: list[str] = None,
+        name: str = None,
+        path: str = None,
+    ) -> "SharedBenchmark":
+        """
+        Pack `netlists` into a new shared-memory segment, or into the file `path`.
+
+        Args:
+            paths: source directory of each netlist, kept in the metadata.
+            name: name of the shared-memory segment (random if not given).
+        """
+        sections = pack_netlists(netlists, paths)
+        header, size = layout_sections(sections)
+
+        if path is not None:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+            with open(tmp_path, "r+b") as f, mmap.mmap(f.fileno(), size) as mm:
+                write_sections(memoryview(mm), header, sections)
+            os.replace(tmp_path, path)
+            return cls.attach(path=path)
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        write_sections(shm.buf, header, sections)
+        return cls(shm.buf, shm=shm, owner=True)
+
+    @classmethod
+    def from_dataset(cls, dataset, **kwargs) -> "SharedBenchmark":
+        """Pack every netlist of a `BenchmarkDataset`."""
+        indices, netlists = zip(*dataset) if len(dataset) else ((), ())
+        return cls.create(
+            list(netlists), [dataset.netlist_path(i) for i in indices], **kwargs
+        )
+
+    @classmethod
+    def attach(cls, name: str = None, path: str = None) -> "SharedBenchmark":
+        if path is not None:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return cls(mm, mm=mm, path=path)
+
+        try:
+            # python >= 3.13: do not let this process' tracker unlink the owner's segment
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm.buf, shm=shm)
+
+    def __reduce__(self):
+        return attach_benchmark, (self.name, self.path)
+
+    def __len__(self):
+        return len(self.arrays["text_offsets"]) - 1
+
+    def __getitem__(self, position: int) -> SharedNetlist:
+        if not -len(self) <= position < len(self):
+            raise IndexError(position)
+        return SharedNetlist(self, position % len(self))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def close(self):
+        """Detach (and unlink, in the creating process); views handed out must be dropped first."""
+        self.arrays = {}
+        self._buf = None
+        if self._shm is not None:
+            self._shm.close()
+            if self.owner:
+                self._shm.unlink()
+            self._shm = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _count_transistors(args):
+    benchmark, position = args
+    return int(benchmark[position].num_transistors)
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+
+    from src.dataset import BenchmarkDataset
+
+    with SharedBenchmark.from_dataset(BenchmarkDataset("small")) as benchmark:
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            counts = executor.map(
+                _count_transistors, [(benchmark, i) for i in range(len(benchmark))]
+            )
+            print(dict(zip(benchmark.paths, counts)))
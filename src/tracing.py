@@ -0,0 +1,91 @@
+"""
+Opt-in structured tracing for the metric and evaluation code.
+
+Call sites guard every record with `if tracing.enabled:`, so nothing is formatted or
+allocated unless a trace is being collected:
+
+    from src import tracing
+
+    if tracing.enabled:
+        tracing.emit("pair", cluster="CM-3", t1="m1", t2="m2", ok=False)
+
+Collect records in memory, or stream them to a JSON-lines file:
+
+    with tracing.trace() as records:
+        compute_cluster_metrics(predicted, ground_truth)
+
+    with tracing.trace("logs/metrics-trace.jsonl"):
+        ...
+
+Setting `ASI_LLM_TRACE=<file>` traces a whole run to that file.
+"""
+
+import os
+import json
+from contextlib import contextmanager
+
+# fast check for the call sites; True while at least one sink is active
+enabled = False
+_sinks = []
+
+
+def emit(event: str, **fields):
+    """Send one record `{"event": event, **fields}` to every active sink."""
+    record = {"event": event, **fields}
+    for sink in _sinks:
+        sink(record)
+
+
+def add_sink(sink):
+    global enabled
+    _sinks.append(sink)
+    enabled = True
+
+
+def remove_sink(sink):
+    global enabled
+    _sinks.remove(sink)
+    enabled = bool(_sinks)
+
+
+def jsonl_sink(file):
+    """Sink writing one JSON object per line (sets and tuples become lists)."""
+
+    def sink(record):
+        file.write(json.dumps(record, default=list) + "\n")
+
+    return sink
+
+
+@contextmanager
+def trace(path: str = None):
+    """
+    Enable tracing for the enclosed block.
+
+    Args:
+        path: JSON-lines file to append the records to; collected in a list if not given.
+
+    Yields:
+        The list of collected records (empty when writing to `path`).
+    """
+    records = []
+    if path is None:
+        sink = records.append
+        file = None
+    else:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        file = open(path, "a")
+        sink = jsonl_sink(file)
+
+    add_sink(sink)
+    try:
+        yield records
+    finally:
+        remove_sink(sink)
+        if file is not None:
+            file.close()
+
+
+if os.getenv("ASI_LLM_TRACE"):
+    add_sink(jsonl_sink(open(os.environ["ASI_LLM_TRACE"], "a", buffering=1)))
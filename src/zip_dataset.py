@@ -0,0 +1,179 @@
+import io
+import os
+import glob
+import fnmatch
+import threading
+import zipfile
+import posixpath
+from collections import defaultdict
+
+from loguru import logger
+
+# one shared `ZipArchive` per archive path (and per process, see `get_archive`)
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+class ZipArchive:
+    """
+    Read-only view over a dataset archive, e.g. `data/asi-fuboco-test.zip`.
+
+    The archive is opened once and the central directory is turned into an index
+    (member name -> `ZipInfo`, which holds the member's header offset, size and CRC),
+    so looking a file up never scans the archive again and members are only
+    decompressed when they are actually read.
+    """
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        self.pid = os.getpid()
+        self.zf = zipfile.ZipFile(archive_path, "r")
+        self.index = {
+            info.filename: info for info in self.zf.infolist() if not info.is_dir()
+        }
+        # directories are often implicit in zip files, so derive them from the members
+        self.dirs = set()
+        self.children = defaultdict(set)
+        for name in self.index:
+            child = name
+            parent = posixpath.dirname(child)
+            while parent:
+                self.children[parent].add(posixpath.basename(child))
+                if parent in self.dirs:
+                    break
+                self.dirs.add(parent)
+                child = parent
+                parent = posixpath.dirname(child)
+        logger.debug(f"indexed {len(self.index)} members of {archive_path}")
+
+    def isfile(self, member: str) -> bool:
+        return member in self.index
+
+    def isdir(self, member: str) -> bool:
+        return member.rstrip("/") in self.dirs
+
+    def listdir(self, member_dir: str) -> list[str]:
+        return sorted(self.children.get(member_dir.rstrip("/"), ()))
+
+    def read(self, member: str) -> bytes:
+        return self.zf.read(self.index[member])
+
+    def open(self, member: str, mode: str = "r"):
+        data = self.read(member)
+        if "b" in mode:
+            return io.BytesIO(data)
+        return io.StringIO(data.decode("utf-8"))
+
+    def fingerprint(self, member: str) -> tuple:
+        info = self.index[member]
+        return (posixpath.basename(member), info.CRC, info.file_size)
+
+    def close(self):
+        self.zf.close()
+
+
+def get_archive(archive_path: str) -> ZipArchive:
+    """Return the shared handle for `archive_path`, reopening it after a fork."""
+    key = os.path.abspath(archive_path)
+    with _archives_lock:
+        archive = _archives.get(key)
+        # a forked worker must not share the parent's file offset
+        if archive is None or archive.pid != os.getpid():
+            archive = ZipArchive(archive_path)
+            _archives[key] = archive
+        return archive
+
+
+def _candidate_archives(path: str):
+    """Yield `(archive_path, member_name)` pairs that could hold `path`."""
+    abs_path = os.path.abspath(path)
+    cwd = os.getcwd()
+    parent = abs_path
+    while True:
+        parent, tail = os.path.split(parent)
+        if not tail:
+            return
+        archive_path = os.path.join(parent, tail + ".zip")
+        if os.path.isfile(archive_path):
+            # archives either store members relative to their own directory
+            # (`asi-fuboco-test/small/1/...`) or to the repository root
+            # (`data/asi-fuboco-test/small/1/...`)
+            for base in (parent, cwd):
+                member = os.path.relpath(abs_path, base).replace(os.sep, "/")
+                if not member.startswith(".."):
+                    yield archive_path, member
+
+
+def resolve(path: str):
+    """
+    Locate `path` inside a dataset archive when it does not exist on disk.
+
+    Returns:
+        `(archive, member_name)` or `None` if no archive contains the path.
+    """
+    for archive_path, member in _candidate_archives(path):
+        archive = get_archive(archive_path)
+        if archive.isfile(member) or archive.isdir(member):
+            return archive, member.rstrip("/")
+    return None
+
+
+def exists(path: str) -> bool:
+    return os.path.exists(path) or resolve(path) is not None
+
+
+def open_file(path: str, mode: str = "r"):
+    """`open()` that falls back to the shipped zip archives."""
+    if os.path.exists(path):
+        return open(path, mode)
+    resolved = resolve(path)
+    if resolved is None or not resolved[0].isfile(resolved[1]):
+        raise FileNotFoundError(path)
+    archive, member = resolved
+    return archive.open(member, mode)
+
+
+def glob_files(dirname: str, pattern: str) -> list[str]:
+    """`glob.glob(os.path.join(dirname, pattern))` that also looks inside the archives."""
+    if os.path.isdir(dirname):
+        return sorted(glob.glob(os.path.join(dirname, pattern)))
+    resolved = resolve(dirname)
+    if resolved is None:
+        return []
+    archive, member_dir = resolved
+    return [
+        os.path.join(dirname, name)
+        for name in archive.listdir(member_dir)
+        if fnmatch.fnmatch(name, pattern)
+    ]
+
+
+def listdir(dirname: str) -> list[str]:
+    if os.path.isdir(dirname):
+        return sorted(os.listdir(dirname))
+    resolved = resolve(dirname)
+    if resolved is None:
+        raise FileNotFoundError(dirname)
+    archive, member_dir = resolved
+    return archive.listdir(member_dir)
+
+
+def get_file_fingerprint(path: str) -> tuple:
+    """
+    Cheap change detector for a dataset file:
+    `(basename, mtime_ns, size)` on disk, `(basename, crc32, size)` inside an archive.
+    """
+    if os.path.exists(path):
+        st = os.stat(path)
+        return (os.path.basename(path), st.st_mtime_ns, st.st_size)
+    resolved = resolve(path)
+    if resolved is None:
+        raise FileNotFoundError(path)
+    archive, member = resolved
+    return archive.fingerprint(member)
+
+
+if __name__ == "__main__":
+    # works on a fresh checkout, without unpacking the archives
+    print(glob_files("data/asi-fuboco-test/small/1/", "*"))
+    print(listdir("data/asi-fuboco-test/small")[:10])